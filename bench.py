@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import hashlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg") # headless: the benchmarks never draw, but the scripts import pyplot
+
+import numpy as np
+
+# Macro-benchmark and regression harness for the experiment scripts.
+#
+# Each benchmark runs the compute phase of one script (no plotting) and
+# records wall time, peak traced memory and its numerical outputs. Results are
+# appended to a local history file; a run fails when it is slower than the
+# last passing run of the same benchmark by more than --time-threshold, or
+# when any output drifts by more than --tolerance (relative).
+#
+#   python bench.py                       # all benchmarks
+#   python bench.py fw_experiments --repeat 5
+#   python bench.py --crossover           # where parallel.py dispatch pays off
+
+HISTORY = "bench_history.jsonl"
+TIME_THRESHOLD = .25 # allowed relative slowdown
+TIME_SLACK = .005 # s, slowdowns below this are timer noise
+TOLERANCE = 1e-9 # allowed relative drift of any output
+DIGEST_DIGITS = 9 # significant digits hashed into the digest
+BATCH_POINTS = 1 << 20
+CROSSOVER_SIZES = [1 << k for k in range(12, 24, 2)]
+
+def flatten(values):
+    return np.asarray(values, dtype=float).ravel()
+
+def bench_dellrexp():
+    dellrexp = importlib.import_module("dellrexp")
+    carbon = dellrexp.get_carbon_by_config([32, 64, 128, 192, 1024], [1820, 3840, 7680], [3, 6, 9])
+    return flatten([carbon[key] for key in sorted(carbon)])
+
+def bench_comparative_cost():
+    comparative_cost = importlib.import_module("comparative-cost")
+    outputs = []
+    for limit_flash in (False, True):
+        cost_lines, _, emission_lines, _, _ = comparative_cost.get_lines(comparative_cost.LIFETIMES, limit_flash)
+        outputs += [cost_lines[life] for life in comparative_cost.LIFETIMES]
+        outputs += [emission_lines[life] for life in comparative_cost.LIFETIMES]
+    return flatten(outputs)
+
+def bench_fw_experiments():
+    fw = importlib.import_module("fw_experiments")
+    table = fw.evaluate(fw.LIFETIMES, fw.RESULTS, fw.SCALING, fw.DENSITIES)
+    numeric = [column for column, values in table.items() if values.dtype.kind == 'f']
+    return flatten([table[column] for column in numeric])
+
+def bench_fw_density():
+    # the density plot inputs: minima over lifetimes per label and density
+    fw = importlib.import_module("fw_experiments")
+    table = fw.evaluate(fw.LIFETIMES, fw.RESULTS, fw.SCALING, fw.DENSITIES)
+    carbons, costs = fw.get_density_minima(table)
+    return flatten([values[label] for values in (carbons, costs) for label in values])
+
+def batch_points(n):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 2048, n).astype(float), rng.integers(0, 30720, n).astype(float)
+
+def run_batch(dram, ssd):
+    dellrexp = importlib.import_module("dellrexp")
+    operational = importlib.import_module("operational")
+    return sum(dellrexp.get_embodied_carbon_batch(dram + dram/8, ssd)) + \
+           sum(operational.get_operational_carbon_batch(dram, ssd, "US"))
+
+def bench_batch():
+    parallel = importlib.import_module("parallel")
+    threshold = parallel.THRESHOLD
+    parallel.disable()
+    try:
+        return run_batch(*batch_points(BATCH_POINTS))
+    finally:
+        parallel.THRESHOLD = threshold
+
+def bench_batch_parallel():
+    # same points through parallel.py (in-process when there is one worker)
+    parallel = importlib.import_module("parallel")
+    threshold = parallel.THRESHOLD
+    parallel.configure(threshold=0)
+    try:
+        return run_batch(*batch_points(BATCH_POINTS))
+    finally:
+        parallel.THRESHOLD = threshold
+
+BENCHMARKS = {
+    "dellrexp": bench_dellrexp,
+    "comparative-cost": bench_comparative_cost,
+    "fw_experiments": bench_fw_experiments,
+    "fw_density": bench_fw_density,
+    "batch": bench_batch,
+    "batch-parallel": bench_batch_parallel,
+}
+
+def crossover(repeat, workers):
+    # serial vs parallel wall time per batch size; the smallest size from
+    # which parallel is faster at every larger size, or None
+    parallel = importlib.import_module("parallel")
+    parallel.configure(workers=workers)
+    rows = []
+    for size in CROSSOVER_SIZES:
+        points = batch_points(size)
+        walls = []
+        for threshold in (None, 0):
+            parallel.THRESHOLD = threshold
+            run_batch(*points) # warm-up (pool start, config caches)
+            walls.append(min(timed(run_batch, *points) for _ in range(repeat)))
+        rows.append((size, *walls))
+    parallel.disable()
+    wins = [size for size, serial, shared in rows if shared < serial]
+    threshold = next((size for size, _, _ in rows if all(s in wins for s, _, _ in rows if s >= size)), None)
+    return rows, threshold
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def digest(values):
+    rounded = np.array([float(f"{v:.{DIGEST_DIGITS}g}") for v in values.tolist()])
+    return hashlib.sha256(rounded.tobytes()).hexdigest()[:16]
+
+def measure(func, repeat):
+    # a warm-up run (imports, config caches), one traced run for peak memory
+    # and outputs, then untraced runs for time
+    func()
+    tracemalloc.start()
+    values = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    walls = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        walls.append(time.perf_counter() - start)
+    return min(walls), peak, values
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def last_passing(history, name):
+    for entry in reversed(history):
+        if entry["benchmark"] == name and entry["ok"]:
+            return entry
+    return None
+
+def compare(entry, baseline, time_threshold, tolerance):
+    # list of regression messages (empty if the entry passes)
+    if baseline is None:
+        return []
+    problems = []
+    if entry["wall"] > baseline["wall"] * (1 + time_threshold) and \
+       entry["wall"] - baseline["wall"] > TIME_SLACK:
+        problems.append(f"wall time {entry['wall']:.4f}s vs {baseline['wall']:.4f}s "
+                        f"(+{entry['wall'] / baseline['wall'] - 1:.0%})")
+
+    values, expected = np.array(entry["values"]), np.array(baseline["values"])
+    if values.shape != expected.shape:
+        problems.append(f"output shape {values.shape} vs {expected.shape}")
+    else:
+        drift = np.abs(values - expected) / np.maximum(np.abs(expected), np.finfo(float).tiny)
+        drift = np.where(values == expected, 0., drift)
+        if drift.size and drift.max() > tolerance:
+            i = int(np.argmax(drift))
+            problems.append(f"output {i} drifted by {drift[i]:.3g} ({expected[i]!r} -> {values[i]!r})")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+                        help=f"subset of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--history', default=HISTORY)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-threshold', type=float, default=TIME_THRESHOLD)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--no-record', action='store_true', help='do not append to the history file')
+    parser.add_argument('--crossover', action='store_true',
+                        help='time serial vs parallel batches and suggest a parallel.configure threshold')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1) # for --crossover
+    args = parser.parse_args()
+    if args.crossover:
+        rows, threshold = crossover(args.repeat, max(args.workers, 2))
+        for size, serial, shared in rows:
+            print(f"{size} points: serial {serial:.4f}s, parallel {shared:.4f}s ({serial / shared:.2f}x)")
+        if (os.cpu_count() or 1) == 1:
+            print("1 CPU: parallel dispatch stays off (use_parallel needs more than one worker)")
+        elif threshold is None:
+            print("parallel is never faster here: leave dispatch off")
+        else:
+            print(f"suggested: parallel.configure(threshold={threshold})")
+        return
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}")
+
+    history = load_history(args.history)
+    commit = get_commit()
+    failed = False
+    entries = []
+    for name in args.benchmarks or list(BENCHMARKS):
+        wall, peak, values = measure(BENCHMARKS[name], args.repeat)
+        entry = {
+            "benchmark": name,
+            "date": datetime.datetime.now().isoformat(timespec='seconds'),
+            "commit": commit,
+            "wall": wall,
+            "peak_bytes": peak,
+            "digest": digest(values),
+            "values": values.tolist(),
+        }
+        baseline = last_passing(history, name)
+        problems = compare(entry, baseline, args.time_threshold, args.tolerance)
+        entry["ok"] = not problems
+        entries.append(entry)
+
+        status = "FAIL" if problems else "ok"
+        print(f"{name}: {wall:.4f}s, peak {peak / 1024:.1f} KiB, digest {entry['digest']} [{status}]")
+        for problem in problems:
+            print(f"\t{problem}")
+        failed |= bool(problems)
+
+    if not args.no_record:
+        with open(args.history, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
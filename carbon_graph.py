@@ -0,0 +1,151 @@
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import numpy as np
+
+from component import load_config
+from dellrexp import get_embodied_carbon_batch
+from logic_model import get_fab_ci, get_gpa_config
+from operational import get_operational_carbon_batch
+
+###############################
+# Lazy dependency graph of named model quantities.
+#
+# Inputs are set with set(); derived nodes are computed on demand by get()
+# and cached together with the versions of the dependencies they were built
+# from. A node is only recomputed when one of its dependencies changed, and a
+# recomputed node that comes out equal to its previous value keeps its
+# version, so nodes further downstream stay cached too. `recomputed` lists
+# the derived nodes evaluated since the last reset_log().
+###############################
+
+def same_value(a, b):
+    if a is b:
+        return True
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(same_value(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+class Graph():
+    def __init__(self):
+        self.funcs      = {} # name -> (func, dependency names) for derived nodes
+        self.values     = {}
+        self.versions   = {}
+        self.built_from = {} # name -> dependency versions the cached value used
+        self.recomputed = []
+
+    def input(self, name, value):
+        assert name not in self.funcs, f"{name} is a derived node"
+        self.values[name] = value
+        self.versions[name] = 0
+        return self
+
+    def node(self, name, func, deps):
+        assert name not in self.values and name not in self.funcs, f"{name} already defined"
+        for dep in deps:
+            assert dep in self.values or dep in self.funcs, f"unknown dependency {dep} of {name}"
+        self.funcs[name] = (func, tuple(deps))
+        return self
+
+    def set(self, name, value):
+        assert name in self.versions and name not in self.funcs, f"{name} is not an input"
+        if not same_value(self.values[name], value):
+            self.values[name] = value
+            self.versions[name] += 1
+
+    def update(self, **inputs):
+        for name, value in inputs.items():
+            self.set(name, value)
+
+    def get(self, name):
+        if name not in self.funcs:
+            return self.values[name]
+
+        func, deps = self.funcs[name]
+        args = [self.get(dep) for dep in deps]
+        dep_versions = tuple(self.versions[dep] for dep in deps)
+        if self.built_from.get(name) == dep_versions:
+            return self.values[name]
+
+        value = func(*args)
+        self.recomputed.append(name)
+        if name not in self.values:
+            self.versions[name] = 0
+        elif not same_value(self.values[name], value):
+            self.versions[name] += 1
+        self.values[name] = value
+        self.built_from[name] = dep_versions
+        return value
+
+    def reset_log(self):
+        recomputed, self.recomputed = self.recomputed, []
+        return recomputed
+
+###############################
+# Logic (SoC) chain:
+#   fab CI -> carbon/area -> die carbon -> packaged carbon -> amortized carbon
+###############################
+def logic_graph(process_node=14, gpa="97", carbon_intensity="loc_taiwan",
+                fab_yield=0.875, area=1., packages=1, packaging_intensity=150,
+                lifetime=3):
+    g = Graph()
+    g.input("process_node", process_node)
+    g.input("gpa", gpa)
+    g.input("carbon_intensity", carbon_intensity)
+    g.input("fab_yield", fab_yield)
+    g.input("area", area) # cm^2
+    g.input("packages", packages)
+    g.input("packaging_intensity", packaging_intensity) # g CO2 per package
+    g.input("lifetime", lifetime) # years
+
+    g.node("node_key", lambda node: str(node) + "nm", ["process_node"])
+    g.node("fab_ci", get_fab_ci, ["carbon_intensity"])
+    g.node("epa", lambda key: load_config("logic/epa.json")[key], ["node_key"])
+    g.node("carbon_gas", lambda gpa, key: get_gpa_config(gpa)[key], ["gpa", "node_key"])
+    g.node("carbon_materials", lambda key: load_config("logic/materials.json")[key], ["node_key"])
+    g.node("carbon_energy", lambda ci, epa: ci * epa, ["fab_ci", "epa"])
+    g.node("carbon_per_area",
+           lambda energy, gas, materials, y: (energy + gas + materials) / y,
+           ["carbon_energy", "carbon_gas", "carbon_materials", "fab_yield"])
+    g.node("die_carbon", lambda area, cpa: area * cpa, ["area", "carbon_per_area"]) # g
+    g.node("packaged_carbon", lambda die, nr, intensity: (die + nr * intensity) / 1000.,
+           ["die_carbon", "packages", "packaging_intensity"]) # kg
+    g.node("amortized_carbon", lambda packaged, life: packaged / life,
+           ["packaged_carbon", "lifetime"]) # kg/year
+    return g
+
+###############################
+# Server model used by the experiments (dellrexp / fw_experiments):
+# (dram, ssd) -> embodied + operational, lifetime only enters the amortization
+###############################
+def server_graph(dram=0, ssd=0, lifetime=3, region="wind-solar"):
+    g = Graph()
+    g.input("dram", dram) # GB, without ECC
+    g.input("ssd", ssd) # GB
+    g.input("lifetime", lifetime) # years
+    g.input("region", region)
+
+    g.node("dram_with_ecc", lambda dram: dram + dram/8, ["dram"])
+    g.node("embodied", get_embodied_carbon_batch, ["dram_with_ecc", "ssd"]) # (ssd, dram, cpu)
+    g.node("embodied_total", lambda e: sum(e), ["embodied"]) # kg over lifetime
+    g.node("operational", get_operational_carbon_batch, ["dram", "ssd", "region"]) # (flash, cpu, dram)
+    g.node("operational_total", lambda o: sum(o), ["operational"]) # kg/year
+    g.node("amortized_embodied", lambda e, life: e / life, ["embodied_total", "lifetime"])
+    g.node("total", lambda e, o: e + o, ["amortized_embodied", "operational_total"])
+    return g
+
+if __name__ == '__main__':
+    g = server_graph(dram=64, ssd=3840)
+    for life in [3, 6, 9]:
+        g.set("lifetime", life)
+        print(f"Lifetime {life}: {float(g.get('total'))} kg/year, recomputed {g.reset_log()}")
+    g.set("region", "US")
+    print(f"US: {float(g.get('total'))} kg/year, recomputed {g.reset_log()}")
@@ -6,6 +6,7 @@ import numpy
 import matplotlib
 
 from dellrexp import get_embodied_carbon
+from memo import Memo
 from operational import get_operational_carbon
 
 # write rate multiple, cost multiple
@@ -25,6 +26,10 @@ WRITE_RATES_DWPD = [(wr * 86400) / (CAPACITY * 1024 * 1024) for wr in WRITE_RATE
 
 DEVICE_WRITES = 3 * 3 * CAPACITY # per day times rated lifetime
 
+# lower overprovisioned micron 7300 NVMe U.2 price fit, r^2 = .9997
+PRICE_PER_TB = 163.99
+FIXED_COST = 122.78
+
 FIGSIZE = (4.5,3.5)
 
 # FIGSIZE = (10, 4) # for legend
@@ -32,9 +37,7 @@ FIGSIZE = (4.5,3.5)
 # TBPD = DEVICE_WRITES / LIFETIME #tb per day
 
 def get_cost(capacity_tb, multiple=1):
-    # lower overprovisioned micron 7300 NVMe U.2
-    # r^2 = .9997
-    return 163.99 * capacity_tb * multiple + 122.78
+    return PRICE_PER_TB * capacity_tb * multiple + FIXED_COST
 
 def get_wr_cost(wr_mbs, flash_type, lifetime, limit_flash=True):
     wr_tbpd = wr_mbs * (60 * 60 * 24) / (1024 * 1024)
@@ -44,10 +47,21 @@ def get_wr_cost(wr_mbs, flash_type, lifetime, limit_flash=True):
         min_flash = max(min_flash, CAPACITY)
     return get_cost(min_flash, flash_type[1]), min_flash
 
+# model entry points used by get_carbon; use_memoization swaps in cached ones
+embodied_carbon = get_embodied_carbon
+operational_carbon = get_operational_carbon
+
+def use_memoization():
+    # with limit_flash most write rates clamp to the same capacity, so the
+    # model is called with the same inputs over and over
+    global embodied_carbon, operational_carbon
+    embodied_carbon = Memo(get_embodied_carbon)
+    operational_carbon = Memo(get_operational_carbon)
+
 def get_carbon(ssd_cap_gb, discount): # per year
     ssd = ssd_cap_gb * discount
-    e_total = get_embodied_carbon(0, ssd)[0]
-    o_total = get_operational_carbon(0, ssd)["wind-solar"][0] # per year
+    e_total = embodied_carbon(0, ssd)[0]
+    o_total = operational_carbon(0, ssd)["wind-solar"][0] # per year
     return e_total + o_total
 
 COLORS = ["r", "b", "g", "c", "m", "y", "k", "tab:orange", "tab:blue"]
@@ -137,12 +151,16 @@ def graph_wr_vs_emissions(savename, lines, sublines):
     plt.savefig(savename)
     print(f"Saved figure to {savename}")
 
-def main(savename, limit_flash):
-    lifetimes = [3,5,7,10]
+LIFETIMES = [3,5,7,10]
+
+def get_lines(lifetimes, limit_flash):
+    # compute phase of main: per lifetime, the cheapest/lowest-carbon flash
+    # type at every write rate, plus where the cheapest type changes
     emission_lines = {}
     emissions_sublines = {}
     cost_lines = {}
     cost_sublines = {}
+    crossovers = {}
     for lifetime in lifetimes:
         cost_possibilities = []
         carbon_possibilites = []
@@ -160,22 +178,36 @@ def main(savename, limit_flash):
         argmin = [numpy.argmin([el[i] for el in cost_possibilities]) for i in range(len(WRITE_RATES))]
         seen = set()
         writes = list(WRITE_RATES)
+        crossovers[lifetime] = []
         for i, val in enumerate(argmin[::-1]):
             if val not in seen:
-                print(f"Lifetime {lifetime}:", list(FLASH_TYPES.keys())[val], val, WRITE_RATES_DWPD[len(writes) - i - 1])
+                crossovers[lifetime].append((list(FLASH_TYPES.keys())[val], val, WRITE_RATES_DWPD[len(writes) - i - 1]))
                 seen.add(val)
 
         cost_lines[lifetime] = min_costs
         cost_sublines[lifetime] = cost_possibilities
         emission_lines[lifetime] = min_emissions
         emissions_sublines[lifetime] = carbon_possibilites
+    return cost_lines, cost_sublines, emission_lines, emissions_sublines, crossovers
+
+def main(savename, limit_flash, memoize=False):
+    if memoize:
+        use_memoization()
+    cost_lines, cost_sublines, emission_lines, emissions_sublines, crossovers = get_lines(LIFETIMES, limit_flash)
+    for lifetime, points in crossovers.items():
+        for label, val, dwpd in points:
+            print(f"Lifetime {lifetime}:", label, val, dwpd)
     graph_wr_vs_costs(f"{savename}-costs.pdf", cost_lines, cost_sublines)
     graph_wr_vs_emissions(f"{savename}-emissions.pdf", emission_lines, emissions_sublines)
-    
+    if memoize:
+        print("Embodied carbon cache:", embodied_carbon.stats())
+        print("Operational carbon cache:", operational_carbon.stats())
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('savename')
     parser.add_argument('--limit_flash', '-l', action='store_true') # limit curves by capacity
+    parser.add_argument('--memoize', '-m', action='store_true') # cache repeated model inputs
     args = parser.parse_args()
-    main(args.savename, args.limit_flash)
+    main(args.savename, args.limit_flash, args.memoize)
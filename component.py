@@ -0,0 +1,39 @@
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import functools
+import json
+
+prefix = "ZNS-sim/ACT"
+
+###############################
+# Config files are read once per process and shared by every descriptor.
+# Callers must treat the returned dictionaries as read-only.
+###############################
+@functools.lru_cache(maxsize=None)
+def load_config(path):
+    with open(f"{prefix}/{path}", 'r') as f:
+        return json.load(f)
+
+class Fab_Component():
+    # Component descriptors are fixed once constructed: every carbon query is a
+    # pure function of its argument, so one instance per fab setting can be
+    # shared across threads and sweep points.
+    __slots__ = ()
+
+    def _freeze(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
@@ -4,12 +4,12 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-import json
+import functools
 import itertools
 import math
 import sys
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from operator import add
 import matplotlib.pyplot as plt
 import numpy as np
@@ -20,18 +20,46 @@ from ssd_model  import Fab_SSD
 from logic_model  import Fab_Logic
 
 from operational import get_operational_carbon
+import parallel
 
 debug = False
 
 dellr740_large_ssd = 957 # GB (1.92 TB)
 dellr740_dram      = 32 + (32 / 8) #36 # GB (32 + 4 ECC GB x 12)
-
-def get_embodied_carbon(dellr740_dram, dellr740_large_ssd):
-    dellr740_ssd_dram  = 68 # GB (64 + 4GB ECC)
-    ic_yield           = 0.875
-
-    cpu_area = 6.98 #cm^2
-
+dellr740_ssd_dram  = 68 # GB (64 + 4GB ECC)
+ic_yield           = 0.875
+
+cpu_area = 6.98 #cm^2
+
+##################################
+# Packaging footprint
+##################################
+# number of packages
+ssd_main_nr         = 12 + 1
+# ssd_secondary_nr    = 12 + 1
+dram_nr             = 18 + 1
+cpu_nr              = 2
+packaging_intensity = 150 # gram CO2
+
+SSD_main_packaging      = packaging_intensity * ssd_main_nr
+# SSD_secondary_packaging = packaging_intensity * ssd_secondary_nr
+DRAM_packging           = packaging_intensity * dram_nr
+CPU_packaging           = packaging_intensity * cpu_nr
+
+total_packaging = SSD_main_packaging +  \
+                DRAM_packging + \
+                CPU_packaging
+total_packaging = total_packaging / 1000.
+
+SSD_main_count = 1 # There are 8x3.84TB SSD's
+CPU_count      = 1
+
+##############################
+# Component descriptors are immutable, so they are built once (on first use)
+# and shared by every call below.
+##############################
+@functools.lru_cache(maxsize=None)
+def get_components():
     ##############################
     # Estimated process technology node to mimic fairphone LCA process node
     ##############################
@@ -43,70 +71,79 @@ def get_embodied_carbon(dellr740_dram, dellr740_large_ssd):
     SSD_main           = Fab_SSD(config  = "western_digital_2019", fab_yield = ic_yield)
     # SSD_secondary      = Fab_SSD(config  = "nand_30nm", fab_yield = ic_yield)
     DRAM_SSD_main      = Fab_DRAM(config = "ddr3_30nm", fab_yield = ic_yield)
-    DRAM_SSD_secondary = Fab_DRAM(config = "ddr4_10nm", fab_yield = ic_yield)
     DRAM               = Fab_DRAM(config = "ddr4_10nm", fab_yield = ic_yield)
 
-    ##############################
-    # Computing carbon footprint of IC's
-    ##############################
-    CPU_Logic.set_area(cpu_area)
-    DRAM.set_capacity(dellr740_dram)
-
-    DRAM_SSD_main.set_capacity(dellr740_ssd_dram)
-    SSD_main.set_capacity(dellr740_large_ssd)
+    return CPU_Logic, SSD_main, DRAM_SSD_main, DRAM
 
-    DRAM_SSD_secondary.set_capacity(dellr740_ssd_dram)
-    # SSD_secondary.set_capacity(dellr740_ssd)
-
-    ##################################
-    # Computing the packaging footprint
-    ##################################
-    # number of packages
-    ssd_main_nr         = 12 + 1
-    # ssd_secondary_nr    = 12 + 1
-    dram_nr             = 18 + 1
-    cpu_nr              = 2
-    packaging_intensity = 150 # gram CO2
-
-    SSD_main_packaging      = packaging_intensity * ssd_main_nr
-    # SSD_secondary_packaging = packaging_intensity * ssd_secondary_nr
-    DRAM_packging           = packaging_intensity * dram_nr
-    CPU_packaging           = packaging_intensity * cpu_nr
-
-    total_packaging = SSD_main_packaging +  \
-                    DRAM_packging + \
-                    CPU_packaging
-    total_packaging = total_packaging / 1000.
+def get_embodied_carbon(dellr740_dram, dellr740_large_ssd):
+    CPU_Logic, SSD_main, DRAM_SSD_main, DRAM = get_components()
 
     ##################################
     # Compute end-to-end carbon footprints
     ##################################
-    SSD_main_count = 1 # There are 8x3.84TB SSD's
-    SSD_main_co2 = (SSD_main.get_carbon() + \
-                    DRAM_SSD_main.get_carbon() + \
+    SSD_main_co2 = (SSD_main.carbon(dellr740_large_ssd) + \
+                    DRAM_SSD_main.carbon(dellr740_ssd_dram) + \
                     SSD_main_packaging) / 1000.
-    # print(SSD_main.get_carbon(), DRAM_SSD_main.get_carbon(), SSD_main_packaging)
     SSD_main_co2 = SSD_main_co2 * SSD_main_count
 
     # SSD_secondary_count = 1 # There are 1x400GB SSD's
-    # SSD_secondary_co2 = (SSD_secondary.get_carbon() + \
-    #                      DRAM_SSD_secondary.get_carbon() +  \
+    # SSD_secondary_co2 = (SSD_secondary.carbon(dellr740_ssd) + \
+    #                      DRAM_SSD_secondary.carbon(dellr740_ssd_dram) +  \
     #                      SSD_secondary_packaging) / 1000.
     # SSD_secondary_co2 = SSD_secondary_co2 * SSD_secondary_count
 
     DRAM_count = math.ceil(dellr740_dram) / 32 # There are 12 x (32GB+4GB ECC DRAM modules)
-    DRAM_co2 = (DRAM.get_carbon() + DRAM_packging) / 1000. * DRAM_count
+    DRAM_co2 = (DRAM.carbon(dellr740_dram) + DRAM_packging) / 1000. * DRAM_count
     if (not dellr740_dram): 
         DRAM_co2 = 0
     if (not dellr740_large_ssd):
         SSD_main_co2 = 0
 
-    CPU_count = 1
-    CPU_co2   = (CPU_Logic.get_carbon() + CPU_packaging) * CPU_count / 1000.
+    CPU_co2   = (CPU_Logic.carbon(cpu_area) + CPU_packaging) * CPU_count / 1000.
 
     # print(f"\tEmbodied power (flash, cpu, dram): {SSD_main_co2, CPU_co2, DRAM_co2}")
     return (SSD_main_co2, DRAM_co2, CPU_co2)
 
+def get_embodied_carbon_batch(dellr740_dram, dellr740_large_ssd):
+    # Same model as get_embodied_carbon over arrays of capacities; returns
+    # arrays (SSD_main_co2, DRAM_co2, CPU_co2) with identical values per point.
+    # Large batches can be split across worker processes (opt-in, see parallel.py).
+    dram = np.asarray(dellr740_dram, dtype=float)
+    ssd  = np.asarray(dellr740_large_ssd, dtype=float)
+    dram, ssd = np.broadcast_arrays(dram, ssd)
+    if parallel.use_parallel(dram.size):
+        return parallel.map_shared(embodied_carbon_kernel, (dram, ssd), 3)
+    return embodied_carbon_kernel(dram, ssd)
+
+def embodied_carbon_kernel(dram, ssd):
+    terms = get_embodied_terms(dram, ssd)
+    return tuple(np.where(t.present, (t.ic + t.packaging) / 1000. * t.count, 0.) for t in terms.values())
+
+##############################
+# The batch model per component (ssd, dram, cpu), in kg:
+#   (ic + packaging) / 1000 * count where present, else 0
+# ic is the IC carbon in g (at ic_yield) and ic_per_gb its derivative in the
+# component's capacity. count (modules) and present are piecewise constant in
+# the capacity, so the model is linear wherever they do not change.
+# gradients.py and surrogate.py read the model from here.
+##############################
+EmbodiedTerm = namedtuple("EmbodiedTerm", ["ic", "ic_per_gb", "packaging", "count", "present"])
+
+def get_embodied_terms(dram, ssd):
+    CPU_Logic, SSD_main, DRAM_SSD_main, DRAM = get_components()
+    shape = np.broadcast(dram, ssd).shape
+    full = lambda value: np.broadcast_to(np.asarray(value, dtype=float), shape)
+
+    return {
+        "ssd": EmbodiedTerm(SSD_main.carbon_array(ssd) + DRAM_SSD_main.carbon(dellr740_ssd_dram),
+                            full(SSD_main.get_cpg()), SSD_main_packaging,
+                            full(SSD_main_count), np.broadcast_to(ssd != 0, shape)),
+        "dram": EmbodiedTerm(DRAM.carbon_array(dram), full(DRAM.get_cpg()), DRAM_packging,
+                             full(np.ceil(dram) / 32), np.broadcast_to(dram != 0, shape)),
+        "cpu": EmbodiedTerm(full(CPU_Logic.carbon(cpu_area)), full(0.), CPU_packaging,
+                            full(CPU_count), np.ones(shape, dtype=bool)),
+    }
+
 # if debug:
 #     print("ACT SSD main", SSD_main_co2, "kg CO2")
 #     # print("ACT SSD secondary", SSD_secondary_co2, "kg CO2")
@@ -161,25 +198,31 @@ def graph_by_location_and_flash_cap(inputs):
             plt.close()
             print(f"Saved figure to {savename}")
 
-if __name__ == '__main__':
-    dram_caps = [32, 64, 128, 192, 1024]
-    # dram_caps_plus_ecc = 
-    ssd_caps = [1820, 3840, 7680] #[0, 980, 1820, 3840, 7680]
-    lifetimes = [3, 6, 9]
-    # print(dram_caps_plus_ecc)
+def get_carbon_by_config(dram_caps, ssd_caps, lifetimes, verbose=False):
+    # {(dram, ssd, life, location): (embodied per year, operational per year)}
     carbon = {}
     for dram, ssd in itertools.product(dram_caps, ssd_caps):
-        print(f"DRAM: {dram}, SSD: {ssd}")
+        if verbose:
+            print(f"DRAM: {dram}, SSD: {ssd}")
         dram_with_ecc = dram + dram/8
         e_carbon = sum(get_embodied_carbon(dram_with_ecc, ssd)) # over lifetime
-        print(f"\tret {e_carbon}")
+        if verbose:
+            print(f"\tret {e_carbon}")
         o_carbons = get_operational_carbon(dram, ssd) # per year
         o_carbons = {k: sum(v) for (k, v) in o_carbons.items()}
         for life in lifetimes:
             for location, op in o_carbons.items():
                 carbon[(dram, ssd, life, location)] = (e_carbon / life, op)
+    return carbon
+
+if __name__ == '__main__':
+    dram_caps = [32, 64, 128, 192, 1024]
+    # dram_caps_plus_ecc = 
+    ssd_caps = [1820, 3840, 7680] #[0, 980, 1820, 3840, 7680]
+    lifetimes = [3, 6, 9]
+    # print(dram_caps_plus_ecc)
+    carbon = get_carbon_by_config(dram_caps, ssd_caps, lifetimes, verbose=True)
 
     # print(len(carbon.items()))
 
     graph_by_location_and_flash_cap(carbon)
-
@@ -4,36 +4,31 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-import json
-import sys
+import numpy as np
 
-prefix = "ZNS-sim/ACT"
+from component import Fab_Component, load_config
+
+class Fab_DRAM(Fab_Component):
+    __slots__ = ("config", "fab_yield", "carbon_per_gb")
 
-class Fab_DRAM():
     def __init__(self,  config = "ddr4_10nm", fab_yield=0.875):
 
         ###############################
         # Carbon per capacity
         ###############################
-        with open(f"{prefix}/dram/dram_hynix.json", 'r') as f:
-            dram_config = json.load(f)
-
-        assert config in dram_config.keys() and "DRAM configuration not found"
+        dram_config = load_config("dram/dram_hynix.json")
 
-        self.fab_yield = fab_yield
+        assert config in dram_config.keys(), "DRAM configuration not found"
 
-        self.carbon_per_gb = dram_config[config] / self.fab_yield
-        self.carbon        = 0
+        self._freeze(config        = config,
+                     fab_yield     = fab_yield,
+                     carbon_per_gb = dram_config[config] / fab_yield)
 
     def get_cpg(self, ):
         return self.carbon_per_gb
 
-    def set_capacity(self, capacity):
-        self.capacity = capacity
-        self.carbon = self.carbon_per_gb * self.capacity
-
-        return
-
-    def get_carbon(self, ):
-        return self.carbon
+    def carbon(self, capacity):
+        return self.carbon_per_gb * capacity
 
+    def carbon_array(self, capacities):
+        return self.carbon_per_gb * np.asarray(capacities, dtype=float)
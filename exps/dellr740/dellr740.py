@@ -47,14 +47,14 @@ DRAM               = Fab_DRAM(config = "ddr3_50nm", fab_yield = ic_yield)
 ##############################
 # Computing carbon footprint of IC's
 ##############################
-CPU_Logic.set_area(cpu_area)
-DRAM.set_capacity(dellr740_dram)
+CPU_ic_co2                = CPU_Logic.carbon(cpu_area)
+DRAM_ic_co2               = DRAM.carbon(dellr740_dram)
 
-DRAM_SSD_main.set_capacity(dellr740_ssd_dram)
-SSD_main.set_capacity(dellr740_large_ssd)
+DRAM_SSD_main_ic_co2      = DRAM_SSD_main.carbon(dellr740_ssd_dram)
+SSD_main_ic_co2           = SSD_main.carbon(dellr740_large_ssd)
 
-DRAM_SSD_secondary.set_capacity(dellr740_ssd_dram)
-SSD_secondary.set_capacity(dellr740_ssd)
+DRAM_SSD_secondary_ic_co2 = DRAM_SSD_secondary.carbon(dellr740_ssd_dram)
+SSD_secondary_ic_co2      = SSD_secondary.carbon(dellr740_ssd)
 
 ##################################
 # Computing the packaging footprint
@@ -81,22 +81,22 @@ total_packaging = total_packaging / 1000.
 # Compute end-to-end carbon footprints
 ##################################
 SSD_main_count = 8 # There are 8x3.84TB SSD's
-SSD_main_co2 = (SSD_main.get_carbon() + \
-                DRAM_SSD_main.get_carbon() + \
+SSD_main_co2 = (SSD_main_ic_co2 + \
+                DRAM_SSD_main_ic_co2 + \
                 SSD_main_packaging) / 1000.
 SSD_main_co2 = SSD_main_co2 * SSD_main_count
 
 SSD_secondary_count = 1 # There are 1x400GB SSD's
-SSD_secondary_co2 = (SSD_secondary.get_carbon() + \
-                     DRAM_SSD_secondary.get_carbon() +  \
+SSD_secondary_co2 = (SSD_secondary_ic_co2 + \
+                     DRAM_SSD_secondary_ic_co2 +  \
                      SSD_secondary_packaging) / 1000.
 SSD_secondary_co2 = SSD_secondary_co2 * SSD_secondary_count
 
 DRAM_count = 12 # There are 12 x (32GB+4GB ECC DRAM modules)
-DRAM_co2 = (DRAM.get_carbon() + DRAM_packging) / 1000. * DRAM_count
+DRAM_co2 = (DRAM_ic_co2 + DRAM_packging) / 1000. * DRAM_count
 
 CPU_count = 2
-CPU_co2   = (CPU_Logic.get_carbon() + CPU_packaging) * CPU_count / 1000.
+CPU_co2   = (CPU_ic_co2 + CPU_packaging) * CPU_count / 1000.
 
 if debug:
     print("ACT SSD main", SSD_main_co2, "kg CO2")
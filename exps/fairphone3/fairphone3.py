@@ -7,10 +7,12 @@
 import json
 import sys
 
+import numpy as np
+
 from dram_model import Fab_DRAM
 from hdd_model  import Fab_HDD
 from ssd_model  import Fab_SSD
-from logic_model  import Fab_Logic
+from logic_model  import Fab_Logic, get_logic_carbon_batch
 
 debug = False
 
@@ -69,12 +71,6 @@ ic_yield           = 0.875
 # This initializes ACT with an older technology node.
 ##################################
 
-# IC Logic node
-IC_Logic = Fab_Logic(gpa = "95",
-                     carbon_intensity = "src_coal",
-                     process_node = 28,
-                     fab_yield=ic_yield)
-
 # CPU Application processor node
 CPU_Logic = Fab_Logic(gpa  = "95",
                       carbon_intensity = "src_coal",
@@ -91,10 +87,15 @@ SSD   = Fab_SSD(config  = "nand_30nm", fab_yield=ic_yield)
 ##################################
 # Computing the IC footprint
 ##################################
-IC_Logic.set_area(sum(fairphone3_IC_areas)/100.)
-CPU_Logic.set_area(fairphone_cpu_area/100.)
-DRAM.set_capacity(fairphone_ram)
-SSD.set_capacity(fairphone_storage)
+# IC Logic node, all ICs evaluated in one batch (areas in cm^2)
+IC_co2, IC_Logic_co2 = get_logic_carbon_batch(np.array(fairphone3_IC_areas)/100.,
+                                              process_nodes = 28,
+                                              gpas = "95",
+                                              carbon_intensities = "src_coal",
+                                              fab_yields = ic_yield)
+CPU_Logic_co2 = CPU_Logic.carbon(fairphone_cpu_area/100.)
+DRAM_co2      = DRAM.carbon(fairphone_ram)
+SSD_co2       = SSD.carbon(fairphone_storage)
 
 ##################################
 # Computing the packaging footprint
@@ -106,22 +107,24 @@ packaging_intensity = 150 # gram CO2
 PackagingFootprint = nr * packaging_intensity
 
 if debug:
-    print("ACT IC", IC_Logic.get_carbon(), "g CO2")
-    print("ACT CPU", CPU_Logic.get_carbon(), "g CO2")
-    print("ACT DRAM", DRAM.get_carbon(), "g CO2")
-    print("ACT SSD", SSD.get_carbon(), "g CO2")
+    for name, co2 in zip(fairphone3_ICs, IC_co2):
+        print("ACT IC", name, co2, "g CO2")
+    print("ACT IC", IC_Logic_co2, "g CO2")
+    print("ACT CPU", CPU_Logic_co2, "g CO2")
+    print("ACT DRAM", DRAM_co2, "g CO2")
+    print("ACT SSD", SSD_co2, "g CO2")
     print("ACT Packaging", PackagingFootprint, "g CO2")
 
 print("--------------------------------")
-ram_flash = (DRAM.get_carbon() + SSD.get_carbon() + packaging_intensity * 2) / 1000.
+ram_flash = (DRAM_co2 + SSD_co2 + packaging_intensity * 2) / 1000.
 fairphone_ram_flash = 11
 print("ACT RAM + Flash", ram_flash, "kg CO2 vs. LCA", fairphone_ram_flash, "kg CO2")
 
-cpu = (CPU_Logic.get_carbon() + packaging_intensity) / 1000.
+cpu = (CPU_Logic_co2 + packaging_intensity) / 1000.
 fairphone_cpu = 1.07
 print("ACT CPU", cpu, "kg CO2 vs. LCA", fairphone_cpu, "kg CO2")
 
-ics = (IC_Logic.get_carbon() + packaging_intensity * len(fairphone3_ICs)) / 1000.
+ics = (IC_Logic_co2 + packaging_intensity * len(fairphone3_ICs)) / 1000.
 fairphone_ics = 5.3
 print("ACT ICs", ics, "kg CO2 vs. LCA", fairphone_ics, "kg CO2")
 
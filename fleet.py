@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from dellrexp import get_embodied_carbon
+from operational import get_operational_carbon
+
+# Time-stepped fleet lifecycle simulator. Devices are tracked as cohorts
+# (deploy year x SKU) with fractional counts, so the cost of a year is
+# proportional to the number of cohorts, not the number of devices.
+#
+# Each year, in order:
+#   1. cohorts at the refresh age retire and are replaced,
+#   2. devices that failed last year are replaced,
+#   3. new deployments + replacements form this year's cohorts (embodied carbon),
+#   4. cohorts at the upgrade age get their mid-life upgrade (embodied carbon),
+#   5. every active device runs for the year (operational carbon),
+#   6. a failure_rate fraction of every cohort fails.
+
+# embodied in kg per device, operational in kg per device-year; the upgrade
+# fields are the per-device deltas of the mid-life upgrade
+Sku = namedtuple("Sku", ["name", "embodied", "operational",
+                         "upgrade_embodied", "upgrade_operational"],
+                 defaults=[0., 0.])
+
+# refresh_age / upgrade_age in years (None disables), failure_rate is the
+# annual fraction of devices failing, replacement maps a SKU name to the SKU
+# that replaces it (defaults to the same SKU)
+Policy = namedtuple("Policy", ["refresh_age", "failure_rate", "replace_failed",
+                               "upgrade_age", "replacement"],
+                    defaults=[None, 0., True, None, None])
+
+def server_sku(name, dram, ssd, region="wind-solar", upgrade_dram=0):
+    # SKU of the dellrexp server model, optionally with a DRAM upgrade
+    def model(dram):
+        embodied = get_embodied_carbon(dram + dram/8, ssd)
+        operational = sum(get_operational_carbon(dram, ssd)[region])
+        return embodied, operational
+
+    embodied, operational = model(dram)
+    if not upgrade_dram:
+        return Sku(name, sum(embodied), operational)
+
+    upgraded, upgraded_operational = model(dram + upgrade_dram)
+    return Sku(name, sum(embodied), operational,
+               upgrade_embodied = upgraded[1] - embodied[1],
+               upgrade_operational = upgraded_operational - operational)
+
+def simulate(skus, deployments, policy, horizon=None):
+    # deployments: (years, len(skus)) new devices per year and SKU
+    # returns {column: array over years}
+    deployments = np.asarray(deployments, dtype=float)
+    horizon = horizon or deployments.shape[0]
+    if deployments.shape[0] < horizon:
+        deployments = np.vstack([deployments, np.zeros((horizon - deployments.shape[0], len(skus)))])
+
+    n = len(skus)
+    names = [sku.name for sku in skus]
+    embodied = np.array([sku.embodied for sku in skus], dtype=float)
+    operational = np.array([sku.operational for sku in skus], dtype=float)
+    upgrade_embodied = np.array([sku.upgrade_embodied for sku in skus], dtype=float)
+    upgrade_operational = np.array([sku.upgrade_operational for sku in skus], dtype=float)
+    replacement = policy.replacement or {}
+    target = np.array([names.index(replacement.get(name, name)) for name in names])
+
+    # at most one new cohort per (year, SKU)
+    capacity = horizon * n
+    deploy_year = np.zeros(capacity, dtype=np.int64)
+    sku = np.zeros(capacity, dtype=np.int64)
+    count = np.zeros(capacity)
+    upgraded = np.zeros(capacity, dtype=bool)
+    used = 0
+
+    columns = ["embodied", "operational", "total", "devices", "deployed", "retired", "failed", "upgraded"]
+    out = {column: np.zeros(horizon) for column in columns}
+    pending = np.zeros(n) # failed devices awaiting replacement, by replacement SKU
+
+    for year in range(horizon):
+        age = year - deploy_year[:used]
+        c = count[:used]
+        s = sku[:used]
+
+        retired = np.zeros(n)
+        if policy.refresh_age is not None:
+            retiring = (age >= policy.refresh_age) & (c > 0)
+            retired = np.bincount(target[s[retiring]], weights=c[retiring], minlength=n)
+            c[retiring] = 0
+
+        new = deployments[year] + retired + pending
+        new_skus = np.flatnonzero(new > 0)
+        k = len(new_skus)
+        deploy_year[used:used + k] = year
+        sku[used:used + k] = new_skus
+        count[used:used + k] = new[new_skus]
+        used += k
+        year_embodied = new @ embodied
+
+        c = count[:used]
+        s = sku[:used]
+        if policy.upgrade_age is not None:
+            upgrading = (year - deploy_year[:used] == policy.upgrade_age) & ~upgraded[:used] & (c > 0)
+            year_embodied += c[upgrading] @ upgrade_embodied[s[upgrading]]
+            upgraded[:used] |= upgrading
+            out["upgraded"][year] = c[upgrading].sum()
+
+        year_operational = c @ (operational[s] + upgraded[:used] * upgrade_operational[s])
+
+        failed = c * policy.failure_rate
+        c -= failed
+        pending = np.bincount(target[s], weights=failed, minlength=n) if policy.replace_failed else np.zeros(n)
+
+        out["embodied"][year] = year_embodied
+        out["operational"][year] = year_operational
+        out["total"][year] = year_embodied + year_operational
+        out["devices"][year] = c.sum() + failed.sum()
+        out["deployed"][year] = new.sum()
+        out["retired"][year] = retired.sum()
+        out["failed"][year] = failed.sum()
+    return out
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=float, default=1e6)
+    parser.add_argument('--horizon', type=int, default=10) # years
+    parser.add_argument('--dram', type=float, default=64) # GB
+    parser.add_argument('--ssd', type=float, default=3840) # GB
+    parser.add_argument('--region', default="wind-solar")
+    parser.add_argument('--failure_rate', type=float, default=.02)
+    parser.add_argument('--upgrade_dram', type=float, default=0) # GB added mid-life
+    parser.add_argument('--upgrade_age', type=int, default=None)
+    args = parser.parse_args()
+
+    skus = [server_sku("server", args.dram, args.ssd, args.region, args.upgrade_dram)]
+    deployments = np.zeros((args.horizon, 1))
+    deployments[0, 0] = args.devices
+    for refresh_age in [3, 5, 7, 10]:
+        policy = Policy(refresh_age = refresh_age,
+                        failure_rate = args.failure_rate,
+                        upgrade_age = args.upgrade_age)
+        out = simulate(skus, deployments, policy, args.horizon)
+        print(f"Refresh every {refresh_age} years: "
+              f"embodied {out['embodied'].sum() / 1000:.1f} t, "
+              f"operational {out['operational'].sum() / 1000:.1f} t, "
+              f"total {out['total'].sum() / 1000:.1f} t CO2 over {args.horizon} years")
@@ -10,8 +10,8 @@ import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 
-from dellrexp import get_embodied_carbon
-from operational import get_operational_carbon
+from dellrexp import get_embodied_carbon_batch
+from operational import get_operational_carbon_batch
 
 matplotlib.rcParams['pdf.fonttype'] = 42
 matplotlib.rcParams['ps.fonttype'] = 42
@@ -27,6 +27,7 @@ DENSITY_FIGSIZE = (7.5, 3)
 TLC = (1, 1)
 QLC = (.32, .75) # writes, cost/sustainibility
 PLC = (.16, .6) # writes, cost/sustainibility
+DENSITIES = {"TLC": TLC, "QLC": QLC, "PLC": PLC}
 
 RESULTS = {
     "FairyWREN": [400, 7.8, 1.90], 
@@ -39,68 +40,79 @@ def get_flash_cap(min_cap_gb, wr_mbs, lifetime, density_mod):
     lifetime_s = lifetime * 24 * 60 * 60
     dwps = density_mod * DEVICE_WRITES / lifetime_s
     device_size_mb = wr_mbs / dwps
-    return max(device_size_mb / 1024, min_cap_gb)
-
-def get_configurations(lifetimes, results, scaling, density):
-    all_configs = {}
-    for label, params in results.items():
-        configs = []
-        for life in lifetimes:
-            total_flash = get_flash_cap(scaling * params[0], params[1], life, density[0])
-            # if total_flash > params[0] * scaling * FLASH_LIMIT:
-            #     continue
-            total_dram = scaling * params[2]
-            configs.append((life, total_dram, total_flash))
-        # print(label, configs)
-        all_configs[label] = configs
-    return all_configs
-            
-def get_carbon(configs, density): # per year
-    # configs format: {label: [(lifetime, total_dram, total_flash)]}
-    outputs = {}
-    for label, config_list in configs.items():
-        carbon = []
-        for life, dram, ssd in config_list:
-
-            ssd = ssd * density[1]
-
-            dram_with_ecc = dram + dram/8
-            e_ssd, e_dram, e_other = get_embodied_carbon(dram_with_ecc, ssd)
-            e = (e_ssd / life, e_dram / life, e_other / life)
-            e_total = sum(e)
-
-            o_ssd, o_other, o_dram = get_operational_carbon(dram, ssd)["wind-solar"] # per year
-            o = (o_ssd, o_dram, o_other)
-            o_total = sum(o)
-
-            carbon.append((dram, ssd, life, e, o))
-            # print(label, life, ssd, dram, e, o, sum(e) + sum(o))
-        outputs[label] = carbon
-    return outputs 
+    return np.maximum(device_size_mb / 1024, min_cap_gb)
 
 MAX_FLASH_CAP = 768
 def get_flash_cost(flash_cap_gb):
-    flash_devices = math.ceil(flash_cap_gb / MAX_FLASH_CAP)
     capacity_tb = flash_cap_gb / 1024
     return 163.99 * capacity_tb + 122.78
 
 def get_dram_cost(dram_cap_gb):
     return 5.53 * dram_cap_gb
 
-def get_cost(configs, density): # per year
-    outputs = {}
-    for label, config_list in configs.items():
-        cost = []
-        for life, dram, ssd in config_list:
-            ssd = ssd * density[1] 
-            
-            dram_cost = get_dram_cost(dram) / life
-            ssd_cost = get_flash_cost(ssd) / life
-            # print(label, life, ssd, dram, ssd_cost, dram_cost, ssd_cost + dram_cost)
-            cost.append((dram, ssd, life, (ssd_cost, dram_cost)))
-        outputs[label] = cost
-    return outputs
-    
+def evaluate(lifetimes, results, scaling, densities, region="wind-solar"):
+    # Embodied carbon, operational carbon and cost for every
+    # (label, density, lifetime) point in one vectorized pass.
+    # Returns a tidy table {column: array}, one row per point, ordered by
+    # label, then density, then lifetime. All carbon and cost columns are per year.
+    labels = list(results.keys())
+    names = list(densities.keys())
+    label_idx, density_idx, life_idx = np.meshgrid(
+        np.arange(len(labels)), np.arange(len(names)), np.arange(len(lifetimes)), indexing='ij')
+    label_idx, density_idx, life_idx = label_idx.ravel(), density_idx.ravel(), life_idx.ravel()
+
+    params = np.array([results[label] for label in labels], dtype=float)[label_idx]
+    density = np.array([densities[name] for name in names], dtype=float)[density_idx]
+    life = np.asarray(lifetimes)[life_idx]
+
+    total_flash = get_flash_cap(scaling * params[:, 0], params[:, 1], life, density[:, 0])
+    dram = scaling * params[:, 2]
+    ssd = total_flash * density[:, 1]
+
+    dram_with_ecc = dram + dram/8
+    e_ssd, e_dram, e_other = get_embodied_carbon_batch(dram_with_ecc, ssd)
+    o_ssd, o_other, o_dram = get_operational_carbon_batch(dram, ssd, region) # per year
+
+    return {
+        "label": np.array(labels)[label_idx],
+        "density": np.array(names)[density_idx],
+        "lifetime": life,
+        "dram": dram,
+        "ssd": ssd,
+        "e_ssd": e_ssd / life,
+        "e_dram": e_dram / life,
+        "e_other": e_other / life,
+        "o_ssd": o_ssd,
+        "o_dram": o_dram,
+        "o_other": o_other,
+        "cost_ssd": get_flash_cost(ssd) / life,
+        "cost_dram": get_dram_cost(dram) / life,
+    }
+
+def select(table, **conditions):
+    # rows of the table matching column == value for every condition,
+    # as {column: list}
+    mask = np.ones(len(table["label"]), dtype=bool)
+    for column, value in conditions.items():
+        mask &= table[column] == value
+    return {column: values[mask].tolist() for column, values in table.items()}
+
+def get_labels(table):
+    return list(dict.fromkeys(table["label"].tolist()))
+
+def get_density_minima(table):
+    # Per label, the best (minimum over lifetimes) total carbon and total
+    # cost for every density, in table order: ({label: [...]}, {label: [...]}).
+    # Rows are ordered label, density, lifetime, so the table reshapes into
+    # a (label, density, lifetime) grid.
+    labels = get_labels(table)
+    shape = (len(labels), len(dict.fromkeys(table["density"].tolist())), -1)
+    carbon = sum(table[column] for column in ["e_ssd", "e_dram", "e_other", "o_ssd", "o_dram", "o_other"])
+    cost = table["cost_ssd"] + table["cost_dram"]
+    carbon = carbon.reshape(shape).min(axis=-1)
+    cost = cost.reshape(shape).min(axis=-1)
+    return ({label: carbon[i].tolist() for i, label in enumerate(labels)},
+            {label: cost[i].tolist() for i, label in enumerate(labels)})
 
 colors = {
     'Kangaroo': '#00AB8E',
@@ -113,14 +125,17 @@ colors = {
 def get_label_color(label):
     return colors[label]
 
-def plot_carbon_lifetimes(carbons, savename, legend=False):
+def plot_carbon_lifetimes(table, density, savename, legend=False):
     matplotlib.rcParams.update({'font.size': 16})
 
     fig, ax = plt.subplots(figsize=FIGSIZE)
     # print(miss_ratio_dict.keys())
 
-    for label, points in list(carbons.items())[::-1]:
-        dram, ssd, life, e, o = zip(*points)
+    for label in get_labels(table)[::-1]:
+        rows = select(table, label=label, density=density)
+        life = rows["lifetime"]
+        e = list(zip(rows["e_ssd"], rows["e_dram"], rows["e_other"]))
+        o = list(zip(rows["o_ssd"], rows["o_dram"], rows["o_other"]))
         total_carbon = [sum(e[i]) + sum(op) for (i, op) in enumerate(o)] 
         embodied_carbon = [sum(emb) for emb in e]
 
@@ -146,14 +161,16 @@ def plot_carbon_lifetimes(carbons, savename, legend=False):
     plt.savefig(savename)
     print(f'Saved to {savename}')
 
-def plot_cost_lifetimes(cost, savename, legend=False):
+def plot_cost_lifetimes(table, density, savename, legend=False):
     matplotlib.rcParams.update({'font.size': 16})
 
     fig, ax = plt.subplots(figsize=FIGSIZE)
     # print(miss_ratio_dict.keys())
 
-    for label, points in list(cost.items())[::-1]:
-        dram, ssd, life, c = zip(*points)
+    for label in get_labels(table)[::-1]:
+        rows = select(table, label=label, density=density)
+        dram, ssd, life = rows["dram"], rows["ssd"], rows["lifetime"]
+        c = list(zip(rows["cost_ssd"], rows["cost_dram"]))
         total_cost = [sum(i) for i in c] 
 
         ind = total_cost.index(min(total_cost))
@@ -234,39 +251,24 @@ if __name__ == '__main__':
     #     args.filenames,
     #     args.savename,
     # )
+    table = evaluate(LIFETIMES, RESULTS, SCALING, DENSITIES)
+
     print("TLC")
-    configs_tlc = get_configurations(LIFETIMES, RESULTS, SCALING, TLC)
-    print(configs_tlc)
-    carbon_tlc = get_carbon(configs_tlc, TLC)
-    cost_tlc = get_cost(configs_tlc, TLC)
-    plot_carbon_lifetimes(carbon_tlc, "exp-carbon-tlc-lifetimes.png", True)
-    plot_cost_lifetimes(cost_tlc, "exp-cost-tlc-lifetimes.png", True)
+    plot_carbon_lifetimes(table, "TLC", "exp-carbon-tlc-lifetimes.png", True)
+    plot_cost_lifetimes(table, "TLC", "exp-cost-tlc-lifetimes.png", True)
 
     print("QLC")
-    configs_qlc = get_configurations(LIFETIMES, RESULTS, SCALING, QLC)
-    carbon_qlc = get_carbon(configs_qlc, QLC)
-    cost_qlc = get_cost(configs_qlc, QLC)
-    plot_carbon_lifetimes(carbon_qlc, "exp-carbon-qlc-lifetimes.png")
-    plot_cost_lifetimes(cost_qlc, "exp-cost-qlc-lifetimes.png")
+    plot_carbon_lifetimes(table, "QLC", "exp-carbon-qlc-lifetimes.png")
+    plot_cost_lifetimes(table, "QLC", "exp-cost-qlc-lifetimes.png")
 
     print("PLC")
-    configs_plc = get_configurations(LIFETIMES, RESULTS, SCALING, PLC)
-    carbon_plc = get_carbon(configs_plc, PLC)
-    cost_plc = get_cost(configs_plc, PLC)
-    plot_carbon_lifetimes(carbon_plc, "exp-carbon-plc-lifetimes.png")
-    plot_cost_lifetimes(cost_plc, "exp-cost-plc-lifetimes.png", True)
+    plot_carbon_lifetimes(table, "PLC", "exp-carbon-plc-lifetimes.png")
+    plot_cost_lifetimes(table, "PLC", "exp-cost-plc-lifetimes.png", True)
 
     # order: TLC, QLC, PLC
-    carbons_density = {
-        "Minimum": [35.080898285714284, 31.599693714285713, 31.53664014285714], 
-        "Kangaroo": [56.35939934642857, 84.71861445357143, 109.03043129285714], 
-        "FairyWREN": [35.77413483035714, 33.80703069866071, 37.737253127232144]
-    }
-    costs_density = {
-        "Minimum": [44.307296875, 36.29997265625, 35.4742173461914], 
-        "Kangaroo": [162.49335854492185, 358.9949715896607, 564.636194543457], 
-        "FairyWREN": [49.560796875, 44.978480476379396, 61.44666876220703]
-    }
+    carbons_density, costs_density = get_density_minima(table)
+    print(f"Carbon by density: {carbons_density}")
+    print(f"Cost by density: {costs_density}")
 
     plot_carbons_density(carbons_density, "exp-carbon-density.png")
     plot_costs_density(costs_density, "exp-costs-density.png")
\ No newline at end of file
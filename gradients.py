@@ -0,0 +1,160 @@
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import sys
+
+import numpy as np
+
+from dellrexp import get_embodied_carbon_batch, get_embodied_terms, ic_yield
+from operational import get_operational_carbon_batch, get_carbon_intensity, get_kwh_per_year, \
+    get_carbon_emissions, get_power_terms
+
+###############################
+# Analytic derivatives of the server model (dellrexp / operational) over
+# arrays of design points.
+#
+# Total carbon per year is embodied / lifetime + operational, as a function
+# of DRAM capacity (GB, without ECC), SSD capacity (GB), lifetime (years),
+# grid carbon intensity (g/kWh) and the fab yield of every IC. Values and
+# derivatives are built from the batch model's per-component terms
+# (dellrexp.get_embodied_terms, operational.get_power_terms). The module
+# counts (math.ceil of DRAM and flash capacity) are piecewise constant, so
+# their derivative is zero everywhere except at the steps, where it is
+# undefined. Fab yield scales the IC carbon of every component by
+# ic_yield / fab_yield; packaging does not depend on it.
+#
+# test_gradients.py checks every partial against central differences of the
+# batched model; `python gradients.py` runs the same checks on more points.
+###############################
+PARAMETERS = ("dram", "ssd", "lifetime", "carbon_intensity", "fab_yield")
+
+def get_embodied_carbon_grad(dram, ssd, fab_yield=ic_yield):
+    # Embodied carbon (kg, over the lifetime) of get_embodied_carbon_batch
+    # for DRAM capacities including ECC, and {parameter: dE/dparameter}.
+    dram, ssd, fab_yield = np.broadcast_arrays(np.asarray(dram, dtype=float),
+                                               np.asarray(ssd, dtype=float),
+                                               np.asarray(fab_yield, dtype=float))
+    terms = get_embodied_terms(dram, ssd)
+    scale = ic_yield / fab_yield
+    dscale = -scale / fab_yield # d scale / d fab_yield
+
+    carbon = [np.where(t.present, (t.ic * scale + t.packaging) / 1000. * t.count, 0.) for t in terms.values()]
+    slope = {name: np.where(t.present, t.ic_per_gb * scale / 1000. * t.count, 0.) for name, t in terms.items()}
+    d_yield = dscale * sum(np.where(t.present, t.ic / 1000. * t.count, 0.) for t in terms.values())
+    return sum(carbon), {"dram": slope["dram"], "ssd": slope["ssd"], "fab_yield": d_yield}
+
+def get_operational_carbon_grad(dram, ssd, carbon_intensity):
+    # Operational carbon (kg/year) of get_operational_carbon_batch for a grid
+    # intensity in g/kWh, and {parameter: dO/dparameter}.
+    dram, ssd, ci = np.broadcast_arrays(np.asarray(dram, dtype=float),
+                                        np.asarray(ssd, dtype=float),
+                                        np.asarray(carbon_intensity, dtype=float))
+    terms = get_power_terms(dram, ssd)
+    kwh = get_kwh_per_year([t.watts for t in terms.values()])
+    per_gb = lambda name: get_carbon_emissions(ci, get_kwh_per_year([terms[name].watts_per_gb]))[0]
+    return sum(get_carbon_emissions(ci, kwh)), {
+        "dram": per_gb("dram"),
+        "ssd": per_gb("flash"),
+        "carbon_intensity": sum(get_carbon_emissions(1., kwh)),
+    }
+
+def get_total_carbon_grad(dram, ssd, lifetime, carbon_intensity, fab_yield=ic_yield):
+    # Total carbon (kg/year) of the server as in dellrexp.get_carbon_by_config
+    # (dram without ECC; ECC adds 1/8) and {parameter: dT/dparameter}.
+    lifetime = np.asarray(lifetime, dtype=float)
+    dram = np.asarray(dram, dtype=float)
+    embodied, de = get_embodied_carbon_grad(dram + dram/8, ssd, fab_yield)
+    op, do = get_operational_carbon_grad(dram, ssd, carbon_intensity)
+    total = embodied / lifetime + op
+    grad = {
+        "dram": de["dram"] * 9/8 / lifetime + do["dram"],
+        "ssd": de["ssd"] / lifetime + do["ssd"],
+        "lifetime": -embodied / lifetime**2,
+        "carbon_intensity": do["carbon_intensity"],
+        "fab_yield": de["fab_yield"] / lifetime,
+    }
+    return total, {name: np.broadcast_to(value, total.shape) for name, value in grad.items()}
+
+###############################
+# Finite-difference check
+###############################
+def batch_total(dram, ssd, lifetime, carbon_intensity, reference="US"):
+    # total carbon (kg/year) from the batched model at ic_yield; operational
+    # carbon is linear in the intensity, so it is scaled from a reference region
+    dram = np.asarray(dram, dtype=float)
+    operational = sum(get_operational_carbon_batch(dram, ssd, reference)) / get_carbon_intensity(reference)
+    return sum(get_embodied_carbon_batch(dram + dram/8, ssd)) / lifetime + carbon_intensity * operational
+
+def central_difference(f, points, name, rel_step):
+    h = rel_step * np.maximum(np.abs(points[name]), 1.)
+    return (f(**{**points, name: points[name] + h}) - f(**{**points, name: points[name] - h})) / (2 * h)
+
+def relative_error(grad, numeric):
+    scale = np.maximum(np.abs(numeric), np.abs(grad).max() * 1e-12 + 1e-300)
+    return float((np.abs(grad - numeric) / scale).max())
+
+def check_gradients(points, rel_step=1e-4):
+    # largest relative error of every partial against central differences:
+    # of the batched model at ic_yield, and of the analytic total at the
+    # points' fab yields (the batched model has no fab yield parameter)
+    at_ic_yield = {**points, "fab_yield": ic_yield}
+    _, grad = get_total_carbon_grad(**at_ic_yield)
+    _, grad_yield = get_total_carbon_grad(**points)
+    model = {name: points[name] for name in PARAMETERS if name != "fab_yield"}
+    total = lambda **p: get_total_carbon_grad(**p)[0]
+    errors = {}
+    for name in PARAMETERS:
+        errors[name] = relative_error(grad_yield[name], central_difference(total, points, name, rel_step))
+        if name in model:
+            errors[name] = max(errors[name], relative_error(
+                grad[name], central_difference(batch_total, model, name, rel_step)))
+    return errors
+
+def smooth_points(n, rng, rel_step=1e-4):
+    # random design points away from the module-count steps of the model
+    def counts(dram, ssd):
+        return np.stack([get_embodied_terms(dram + dram/8, ssd)["dram"].count,
+                         get_power_terms(dram, ssd)["flash"].count])
+    dram = rng.uniform(1, 2048, n)
+    ssd = rng.uniform(1, 30720, n)
+    for _ in range(100):
+        step = counts(dram * (1 - 2 * rel_step), ssd * (1 - 2 * rel_step)) != \
+               counts(dram * (1 + 2 * rel_step), ssd * (1 + 2 * rel_step))
+        if not step.any():
+            break
+        dram = np.where(step[0], rng.uniform(1, 2048, n), dram)
+        ssd = np.where(step[1], rng.uniform(1, 30720, n), ssd)
+    return {
+        "dram": dram,
+        "ssd": ssd,
+        "lifetime": rng.uniform(1, 10, n),
+        "carbon_intensity": rng.uniform(10, 800, n),
+        "fab_yield": rng.uniform(.5, 1, n),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # the values are the batched model's
+    rng = np.random.default_rng(args.seed)
+    dram, ssd = rng.integers(0, 2048, args.points), rng.integers(0, 30720, args.points)
+    total, _ = get_total_carbon_grad(dram, ssd, 5, get_carbon_intensity("US"))
+    expected = batch_total(dram, ssd, 5, get_carbon_intensity("US"))
+    matches = np.allclose(total, expected, rtol=1e-14, atol=0)
+    print(f"Matches the batched model: {matches} [{'ok' if matches else 'FAIL'}]")
+
+    failed = not matches
+    for name, error in check_gradients(smooth_points(args.points, rng)).items():
+        ok = error <= args.tolerance
+        failed |= not ok
+        print(f"d total / d {name}: max relative error {error:.2e} [{'ok' if ok else 'FAIL'}]")
+    if failed:
+        sys.exit("Error: analytic model or gradients disagree with the batched model / finite differences")
@@ -4,35 +4,30 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-import json
-import sys
+import numpy as np
+
+from component import Fab_Component, load_config
+
+class Fab_HDD(Fab_Component):
+    __slots__ = ("config", "carbon_per_gb")
 
-class Fab_HDD():
     def __init__(self, config="BarraCuda"):
         ###############################
         # Carbon per capacity
         ###############################
-        with open("hdd/hdd_consumer.json", 'r') as f:
-            hdd_config = json.load(f)
-
-        with open("hdd/hdd_enterprise.json", 'r') as f:
-            hdd_config.update(json.load(f))
+        hdd_config = {**load_config("hdd/hdd_consumer.json"),
+                      **load_config("hdd/hdd_enterprise.json")}
 
-        assert config in hdd_config.keys() and "HDD configuration not found"
+        assert config in hdd_config.keys(), "HDD configuration not found"
 
-        self.carbon_per_gb = hdd_config[config]
-        self.carbon        = 0
-        return
+        self._freeze(config        = config,
+                     carbon_per_gb = hdd_config[config])
 
     def get_cpg(self, ):
         return self.carbon_per_gb
 
-    def set_capacity(self, capacity):
-        self.capacity = capacity
-        self.carbon = carbon_per_gb
-
-        return
-
-    def get_carbon(self, ):
-        return self.carbon
+    def carbon(self, capacity):
+        return self.carbon_per_gb * capacity
 
+    def carbon_array(self, capacities):
+        return self.carbon_per_gb * np.asarray(capacities, dtype=float)
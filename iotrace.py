@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import argparse
+import gzip
+import sys
+
+import numpy as np
+
+import fw_experiments
+
+# Streaming block-I/O trace analyzer: turns a write trace into the write
+# rates that size flash in fw_experiments (the mb/s column of RESULTS) and
+# runs them through the flash-capacity and carbon pipeline.
+#
+# Traces are comma-separated lines with a timestamp, an operation and a
+# request size, e.g. the MSR Cambridge format
+#   Timestamp,Hostname,DiskNumber,Type,Offset,Size,ResponseTime
+# with timestamps in Windows filetime (100 ns ticks). An operation whose
+# first character is W/w counts as a write (Write, W, WS, ...).
+#
+# The file is read in fixed-size byte chunks (optionally gzip-compressed, or
+# stdin with -) and each chunk is parsed with array operations on its bytes;
+# only the bytes written per time bucket are kept, so memory grows with the
+# trace duration / --bucket, not with the trace size. Rates over sliding
+# windows are computed from the buckets at the end.
+#
+#   python iotrace.py msr_prxy_0.csv.gz --windows 60 3600 --lifetime 5
+
+CHUNK_BYTES = 16 << 20
+MB = 1 << 20
+NEWLINE, CR, COMMA, DOT, SPACE, ZERO = (ord(c) for c in "\n\r,. 0")
+
+TIME_UNITS = {"s": 1, "ms": 1e-3, "us": 1e-6, "ns": 1e-9, "filetime": 1e-7} # seconds per unit
+FORMATS = {
+    # time column, op column, size column, time unit
+    "msr": (0, 3, 5, "filetime"),
+    "csv": (0, 1, 2, "s"), # timestamp,op,size
+}
+PERCENTILES = [50, 90, 99, 100]
+
+def read_chunks(path, chunk_bytes=CHUNK_BYTES, live=False):
+    # complete lines of the file, chunk_bytes at a time (live: whatever is
+    # available, up to chunk_bytes, so a stream is processed as it arrives)
+    if path == "-":
+        f = sys.stdin.buffer
+    elif path.endswith(".gz"):
+        f = gzip.open(path, 'rb')
+    else:
+        f = open(path, 'rb')
+    tail = b""
+    try:
+        while True:
+            data = f.read1(chunk_bytes) if live else f.read(chunk_bytes)
+            if not data:
+                break
+            data = tail + data
+            end = data.rfind(b"\n") + 1
+            tail = data[end:]
+            if end:
+                yield data[:end]
+        if tail.strip():
+            yield tail + b"\n"
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+def split_fields(buf):
+    # (start, end) byte offsets of every field of every non-empty line, as
+    # (lines, fields) arrays; all lines must have the same number of fields
+    newlines = np.flatnonzero(buf == NEWLINE)
+    starts = np.concatenate([[0], newlines[:-1] + 1])
+    ends = newlines - (buf[np.maximum(newlines - 1, 0)] == CR)
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+
+    commas = np.flatnonzero(buf == COMMA)
+    per_line = np.searchsorted(commas, ends) - np.searchsorted(commas, starts)
+    if len(per_line) and (per_line != per_line[0]).any():
+        line = int(np.argmax(per_line != per_line[0]))
+        raise ValueError(f"line {line + 1} of a chunk has {per_line[line] + 1} fields, "
+                         f"expected {per_line[0] + 1}")
+    commas = commas.reshape(len(starts), -1)
+    field_starts = np.column_stack([starts, commas + 1])
+    field_ends = np.column_stack([commas, ends])
+    return field_starts, field_ends
+
+def parse_numbers(buf, start, end):
+    # decimal fields buf[start:end] as float64, digits accumulated column-wise
+    width = end - start
+    if len(width) == 0:
+        return np.empty(0)
+    j = np.arange(int(width.max()))
+    valid = j < width[:, None]
+    chars = np.where(valid, buf[np.minimum(start[:, None] + j, len(buf) - 1)], SPACE)
+    digit = (chars >= ZERO) & (chars <= ZERO + 9)
+    dot = chars == DOT
+    if (~(digit | dot | (chars == SPACE))).any():
+        bad = int(np.argmax((~(digit | dot | (chars == SPACE))).any(axis=1)))
+        raise ValueError(f"not a number: {bytes(buf[start[bad]:end[bad]]).decode(errors='replace')!r}")
+
+    # place value of each digit = number of digits to its right
+    after = np.cumsum(digit[:, ::-1], axis=1)[:, ::-1] - digit
+    value = (np.where(digit, chars - ZERO, 0).astype(np.int64) * 10 ** after.astype(np.int64)).sum(axis=1)
+    fraction = np.where(dot.any(axis=1), (digit & (np.cumsum(dot, axis=1) > 0)).sum(axis=1), 0)
+    return value / 10. ** fraction
+
+def parse_strings(buf, start, end):
+    # fields buf[start:end] as a fixed-width bytes array
+    width = end - start
+    if len(width) == 0:
+        return np.empty(0, dtype="S1")
+    w = max(int(width.max()), 1)
+    j = np.arange(w)
+    chars = np.where(j < width[:, None], buf[np.minimum(start[:, None] + j, len(buf) - 1)], 0)
+    return np.ascontiguousarray(chars.astype(np.uint8)).view(f"S{w}").ravel()
+
+class WriteRates():
+    # bytes written per time bucket, accumulated chunk by chunk
+    def __init__(self, bucket=1.):
+        self.bucket   = bucket # seconds
+        self.origin   = None # bucket 0 starts here (seconds)
+        self.bytes    = np.zeros(0)
+        self.requests = 0
+        self.writes   = 0
+        self.first    = np.inf
+        self.last     = -np.inf
+
+    def add(self, seconds, sizes, is_write):
+        self.requests += len(seconds)
+        seconds, sizes = seconds[is_write], sizes[is_write]
+        self.writes += len(seconds)
+        if len(seconds) == 0:
+            return
+        self.first = min(self.first, seconds.min())
+        self.last = max(self.last, seconds.max())
+        if self.origin is None:
+            self.origin = np.floor(seconds.min() / self.bucket) * self.bucket
+        index = np.floor((seconds - self.origin) / self.bucket).astype(np.int64)
+        if index.min() < 0: # earlier than anything seen so far
+            shift = -int(index.min())
+            self.bytes = np.concatenate([np.zeros(shift), self.bytes])
+            self.origin -= shift * self.bucket
+            index += shift
+        counts = np.bincount(index, weights=sizes)
+        if len(counts) > len(self.bytes):
+            self.bytes = np.concatenate([self.bytes, np.zeros(len(counts) - len(self.bytes))])
+        self.bytes[:len(counts)] += counts
+
+    def duration(self):
+        # seconds from the first to the end of the last write (at least one bucket)
+        return max(self.last - self.first, self.bucket)
+
+    def sustained(self):
+        # mean write rate in MB/s
+        return self.bytes.sum() / MB / self.duration()
+
+    def window_rates(self, window):
+        # MB/s over every window of `window` seconds, sliding by one bucket
+        k = max(int(round(window / self.bucket)), 1)
+        if len(self.bytes) <= k:
+            return np.array([self.bytes.sum() / MB / max(window, self.duration())])
+        cumulative = np.concatenate([[0.], np.cumsum(self.bytes)])
+        return (cumulative[k:] - cumulative[:-k]) / MB / (k * self.bucket)
+
+def analyze(path, fmt="msr", bucket=1., time_unit=None, size_scale=1, header=False, chunk_bytes=CHUNK_BYTES):
+    time_col, op_col, size_col, default_unit = FORMATS[fmt]
+    seconds_per_unit = TIME_UNITS[time_unit or default_unit]
+    rates = WriteRates(bucket)
+    for i, data in enumerate(read_chunks(path, chunk_bytes)):
+        if i == 0 and header:
+            data = data[data.find(b"\n") + 1:]
+        buf = np.frombuffer(data, dtype=np.uint8)
+        starts, ends = split_fields(buf)
+        if len(starts) == 0:
+            continue
+        if starts.shape[1] <= max(time_col, op_col, size_col):
+            raise ValueError(f"trace has {starts.shape[1]} fields, the {fmt} format needs "
+                             f"{max(time_col, op_col, size_col) + 1}")
+        op = buf[starts[:, op_col]]
+        is_write = (op == ord("W")) | (op == ord("w"))
+        seconds = parse_numbers(buf, starts[:, time_col], ends[:, time_col]) * seconds_per_unit
+        sizes = parse_numbers(buf, starts[:, size_col], ends[:, size_col]) * size_scale
+        rates.add(seconds, sizes, is_write)
+    return rates
+
+def get_dwpd(rate_mbs, capacity_gb):
+    return rate_mbs * 24 * 60 * 60 / (capacity_gb * 1024)
+
+def results_entry(rate_mbs, flash_cap_gb, dram_gb):
+    # a row of fw_experiments.RESULTS: flash cap, mb/s, dram cap
+    return [flash_cap_gb, rate_mbs, dram_gb]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('trace', help='trace file (.gz ok, - for stdin)')
+    parser.add_argument('--format', choices=list(FORMATS), default='msr')
+    parser.add_argument('--time_unit', choices=list(TIME_UNITS), default=None)
+    parser.add_argument('--size_scale', type=float, default=1) # bytes per size unit, e.g. 512 for sectors
+    parser.add_argument('--header', action='store_true') # skip the first line
+    parser.add_argument('--bucket', type=float, default=1) # seconds
+    parser.add_argument('--windows', type=float, nargs='+', default=[60, 3600]) # seconds
+    parser.add_argument('--rate', default='sustained',
+                        help='rate the flash is sized for: sustained | p<percentile>@<window>, e.g. p99@60')
+    parser.add_argument('--flash_cap', type=float, default=400) # minimum flash capacity, GB
+    parser.add_argument('--dram', type=float, default=0) # GB
+    parser.add_argument('--lifetimes', type=float, nargs='+', default=fw_experiments.LIFETIMES)
+    parser.add_argument('--region', default='wind-solar')
+    args = parser.parse_args()
+
+    try:
+        rates = analyze(args.trace, args.format, args.bucket, args.time_unit, args.size_scale, args.header)
+        if rates.writes == 0:
+            raise ValueError("trace has no writes")
+        if args.rate == 'sustained':
+            rate = float(rates.sustained())
+        else:
+            percentile, at, window = args.rate[1:].partition("@")
+            if not args.rate.startswith("p") or not at:
+                raise ValueError(f"--rate must be sustained or p<percentile>@<window>, got {args.rate!r}")
+            rate = float(np.percentile(rates.window_rates(float(window)), float(percentile)))
+    except (ValueError, OSError) as e:
+        sys.exit(f"Error: {e}")
+
+    sustained = rates.sustained()
+    print(f"Trace: {rates.requests} requests, {rates.writes} writes, "
+          f"{rates.bytes.sum() / MB / 1024:.2f} GB written over {rates.duration():.1f} s")
+    print(f"Sustained write rate: {sustained:.3f} MB/s, "
+          f"{get_dwpd(sustained, args.flash_cap):.2f} DWPD on {args.flash_cap:g} GB")
+    for window in args.windows:
+        values = np.percentile(rates.window_rates(window), PERCENTILES)
+        print(f"\t{window:g} s windows: " +
+              ", ".join(f"{'max' if p == 100 else f'p{p}'} {v:.3f} MB/s ({get_dwpd(v, args.flash_cap):.2f} DWPD)"
+                        for p, v in zip(PERCENTILES, values)))
+
+    results = {"trace": results_entry(rate, args.flash_cap, args.dram)}
+    table = fw_experiments.evaluate(args.lifetimes, results, 1, fw_experiments.DENSITIES, args.region)
+    print(f"Flash sizing for {rate:.3f} MB/s ({args.rate}), RESULTS entry {results['trace']}")
+    for density in fw_experiments.DENSITIES:
+        rows = fw_experiments.select(table, density=density)
+        total = [sum(values) for values in zip(*[rows[c] for c in ["e_ssd", "e_dram", "e_other",
+                                                                   "o_ssd", "o_dram", "o_other"]])]
+        best = int(np.argmin(total))
+        print(f"\t{density}: best lifetime {rows['lifetime'][best]:g} years, flash {rows['ssd'][best]:.1f} GB, "
+              f"{total[best]:.2f} kg CO2/year")
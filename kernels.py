@@ -0,0 +1,240 @@
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import importlib
+import math
+import sys
+import time
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+from dellrexp import get_components, get_embodied_carbon, get_embodied_carbon_batch, \
+    dellr740_ssd_dram, cpu_area, SSD_main_packaging, DRAM_packging, CPU_packaging, \
+    SSD_main_count, CPU_count
+import fw_experiments
+import operational
+
+###############################
+# Per-point kernels for the parts of the model with scalar control flow: the
+# math.ceil module counts of get_embodied_carbon / get_operational_carbon, the
+# max() clamp of get_flash_cap and the limit_flash branch of get_wr_cost in
+# comparative-cost.py.
+#
+# The kernels are plain loops over 1-d float64 arrays taking only scalar
+# model parameters, so the same source runs under numba.njit or as Python.
+# Every model constant is passed in from the module that defines it (Numba
+# would freeze globals into its on-disk cache), so the kernels follow any
+# change to the model.
+# Backends:
+#   numba  - the loops compiled with Numba (default when Numba is installed)
+#   numpy  - the vectorized batch functions (default otherwise)
+#   python - the loops uncompiled, for checking the kernel source
+# All three give results identical to the scalar model; `python kernels.py`
+# checks this for every installed backend, exits non-zero on any difference,
+# and times them.
+###############################
+BACKENDS = ("numba", "numpy", "python")
+BACKEND = "numba" if numba is not None else "numpy"
+
+def set_backend(name):
+    global BACKEND
+    assert name in BACKENDS, f"backend must be one of {', '.join(BACKENDS)}"
+    assert name != "numba" or numba is not None, "numba backend needs Numba installed"
+    BACKEND = name
+
+def embodied_loop(dram, ssd, ssd_cpg, ssd_fixed, ssd_packaging, ssd_count, dram_cpg, dram_packaging, cpu_co2):
+    n = dram.shape[0]
+    ssd_co2 = np.empty(n)
+    dram_co2 = np.empty(n)
+    cpu = np.empty(n)
+    for i in range(n):
+        if ssd[i] != 0:
+            ssd_co2[i] = (ssd_cpg * ssd[i] + ssd_fixed + ssd_packaging) / 1000. * ssd_count
+        else:
+            ssd_co2[i] = 0.
+        if dram[i] != 0:
+            dram_co2[i] = (dram_cpg * dram[i] + dram_packaging) / 1000. * (math.ceil(dram[i]) / 32)
+        else:
+            dram_co2[i] = 0.
+        cpu[i] = cpu_co2
+    return ssd_co2, dram_co2, cpu
+
+def operational_loop(dram, flash, carbon_intensity, flash_power, flash_max_cap, cpu_power,
+                     dram_power, dram_power_cap_gb, usage_discount):
+    n = dram.shape[0]
+    flash_co2 = np.empty(n)
+    cpu_co2 = np.empty(n)
+    dram_co2 = np.empty(n)
+    cpu_kwh = float(cpu_power) / 1000 * 8760
+    for i in range(n):
+        flash_kwh = flash_power * math.ceil(flash[i] / flash_max_cap) / 1000 * 8760
+        dram_kwh = dram_power * dram[i] / dram_power_cap_gb / 1000 * 8760
+        flash_co2[i] = usage_discount * carbon_intensity * flash_kwh / 1000
+        cpu_co2[i] = usage_discount * carbon_intensity * cpu_kwh / 1000
+        dram_co2[i] = usage_discount * carbon_intensity * dram_kwh / 1000
+    return flash_co2, cpu_co2, dram_co2
+
+def flash_cap_loop(min_cap_gb, wr_mbs, lifetime, density_mod, device_writes):
+    n = wr_mbs.shape[0]
+    out = np.empty(n)
+    for i in range(n):
+        lifetime_s = lifetime[i] * 24 * 60 * 60
+        dwps = density_mod[i] * device_writes / lifetime_s
+        out[i] = max(wr_mbs[i] / dwps / 1024, min_cap_gb[i])
+    return out
+
+def wr_cost_loop(wr_mbs, write_mod, cost_mod, lifetime, device_writes, capacity, price_per_tb, fixed_cost,
+                 limit_flash):
+    n = wr_mbs.shape[0]
+    cost = np.empty(n)
+    cap = np.empty(n)
+    for i in range(n):
+        wr_tbpd = wr_mbs[i] * (60 * 60 * 24) / (1024 * 1024)
+        tbpd = device_writes / lifetime[i]
+        min_flash = wr_tbpd / (tbpd * write_mod[i]) * capacity
+        if limit_flash:
+            min_flash = max(min_flash, capacity)
+        cost[i] = price_per_tb * min_flash * cost_mod[i] + fixed_cost
+        cap[i] = min_flash
+    return cost, cap
+
+LOOPS = {
+    "python": {
+        "embodied": embodied_loop,
+        "operational": operational_loop,
+        "flash_cap": flash_cap_loop,
+        "wr_cost": wr_cost_loop,
+    }
+}
+if numba is not None:
+    LOOPS["numba"] = {name: numba.njit(cache=True)(loop) for name, loop in LOOPS["python"].items()}
+
+def flat(*arrays):
+    arrays = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in arrays])
+    return arrays[0].shape, [np.ascontiguousarray(x).ravel() for x in arrays]
+
+def embodied_carbon(dram, ssd):
+    # as get_embodied_carbon_batch: (SSD_main_co2, DRAM_co2, CPU_co2)
+    if BACKEND == "numpy":
+        return get_embodied_carbon_batch(dram, ssd)
+    CPU_Logic, SSD_main, DRAM_SSD_main, DRAM = get_components()
+    shape, (dram, ssd) = flat(dram, ssd)
+    out = LOOPS[BACKEND]["embodied"](dram, ssd, SSD_main.get_cpg(), DRAM_SSD_main.carbon(dellr740_ssd_dram),
+                                     float(SSD_main_packaging), float(SSD_main_count), DRAM.get_cpg(),
+                                     float(DRAM_packging),
+                                     (CPU_Logic.carbon(cpu_area) + CPU_packaging) * CPU_count / 1000.)
+    return tuple(x.reshape(shape) for x in out)
+
+def operational_carbon(dram, flash, region):
+    # as get_operational_carbon_batch: (flash, cpu, dram) per year
+    if BACKEND == "numpy":
+        return operational.get_operational_carbon_batch(dram, flash, region)
+    shape, (dram, flash) = flat(dram, flash)
+    out = LOOPS[BACKEND]["operational"](dram, flash, float(operational.get_carbon_intensity(region)),
+                                        *[float(x) for x in (operational.flash_power, operational.flash_max_cap,
+                                                             operational.cpu_power, operational.dram_power,
+                                                             operational.dram_power_cap_gb,
+                                                             operational.usage_discount)])
+    return tuple(x.reshape(shape) for x in out)
+
+def flash_cap(min_cap_gb, wr_mbs, lifetime, density_mod):
+    # as fw_experiments.get_flash_cap
+    if BACKEND == "numpy":
+        return fw_experiments.get_flash_cap(min_cap_gb, wr_mbs, lifetime, density_mod)
+    shape, arrays = flat(min_cap_gb, wr_mbs, lifetime, density_mod)
+    return LOOPS[BACKEND]["flash_cap"](*arrays, float(fw_experiments.DEVICE_WRITES)).reshape(shape)
+
+def wr_cost(wr_mbs, write_mod, cost_mod, lifetime, device_writes, capacity, price_per_tb, fixed_cost,
+            limit_flash=True):
+    # as get_wr_cost in comparative-cost.py over arrays: (cost, capacity in tb);
+    # the price fit is comparative-cost's PRICE_PER_TB and FIXED_COST
+    if BACKEND == "numpy":
+        wr_tbpd = np.asarray(wr_mbs, dtype=float) * (60 * 60 * 24) / (1024 * 1024)
+        tbpd = device_writes / np.asarray(lifetime, dtype=float)
+        min_flash = wr_tbpd / (tbpd * np.asarray(write_mod, dtype=float)) * capacity
+        if limit_flash:
+            min_flash = np.maximum(min_flash, capacity)
+        return price_per_tb * min_flash * np.asarray(cost_mod, dtype=float) + fixed_cost, min_flash
+    shape, arrays = flat(wr_mbs, write_mod, cost_mod, lifetime)
+    cost, cap = LOOPS[BACKEND]["wr_cost"](*arrays, float(device_writes), float(capacity), float(price_per_tb),
+                                          float(fixed_cost), bool(limit_flash))
+    return cost.reshape(shape), cap.reshape(shape)
+
+###############################
+# Identity check against the scalar model and timing of every backend
+###############################
+def scalar_reference(points, region, comparative_cost):
+    # the scalar model point by point
+    out = [[] for _ in range(9)]
+    for dram, ssd, min_cap, wr, lifetime, write_mod, cost_mod in zip(*[x.tolist() for x in points]):
+        values = list(get_embodied_carbon(dram, ssd)) + \
+                 list(operational.get_operational_carbon(dram, ssd)[region]) + \
+                 [float(fw_experiments.get_flash_cap(min_cap, wr, lifetime, write_mod))] + \
+                 list(comparative_cost.get_wr_cost(wr, (write_mod, cost_mod), lifetime, True))
+        for column, value in zip(out, values):
+            column.append(value)
+    return [np.array(column, dtype=float) for column in out]
+
+def run_backend(points, region, comparative_cost):
+    dram, ssd, min_cap, wr, lifetime, write_mod, cost_mod = points
+    return list(embodied_carbon(dram, ssd)) + list(operational_carbon(dram, ssd, region)) + \
+           [flash_cap(min_cap, wr, lifetime, write_mod)] + \
+           list(wr_cost(wr, write_mod, cost_mod, lifetime,
+                        comparative_cost.DEVICE_WRITES, comparative_cost.CAPACITY,
+                        comparative_cost.PRICE_PER_TB, comparative_cost.FIXED_COST, True))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=200000)
+    parser.add_argument('--check_points', type=int, default=2000) # compared against the scalar model
+    parser.add_argument('--region', default="wind-solar")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    comparative_cost = importlib.import_module("comparative-cost")
+
+    rng = np.random.default_rng(0)
+    dram = rng.integers(0, 2048, args.points).astype(float)
+    dram[::7] += .5 # non-integral capacities exercise the ceil
+    ssd = rng.integers(0, 30720, args.points).astype(float)
+    min_cap = rng.uniform(0, 4000, args.points)
+    wr = rng.uniform(1, 100, args.points)
+    lifetime = rng.integers(1, 11, args.points).astype(float)
+    write_mod, cost_mod = np.array(list(comparative_cost.FLASH_TYPES.values()))[
+        rng.integers(0, len(comparative_cost.FLASH_TYPES), args.points)].T
+    points = (dram, ssd, min_cap, wr, lifetime, write_mod, cost_mod)
+
+    n = args.check_points
+    expected = scalar_reference([x[:n] for x in points], args.region, comparative_cost)
+    backends = [b for b in BACKENDS if b != "numba" or numba is not None]
+    if numba is None:
+        print("Numba not installed, numba backend skipped")
+    timings = {}
+    differs = []
+    for backend in backends:
+        set_backend(backend)
+        out = run_backend([x[:n] for x in points], args.region, comparative_cost)
+        identical = all(np.array_equal(x, y) for x, y in zip(out, expected))
+        if not identical:
+            differs.append(backend)
+        run_backend(points, args.region, comparative_cost) # warm-up / compile
+        walls = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run_backend(points, args.region, comparative_cost)
+            walls.append(time.perf_counter() - start)
+        timings[backend] = min(walls)
+        print(f"{backend}: {timings[backend]:.4f}s for {args.points} points, "
+              f"{'identical to' if identical else 'DIFFERS from'} the scalar model")
+    for backend in [b for b in backends if b != "python"]:
+        print(f"\t{backend} speedup over python: {timings['python'] / timings[backend]:.1f}x")
+    if differs:
+        sys.exit(f"Error: {', '.join(differs)} backend(s) differ from the scalar model")
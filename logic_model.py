@@ -4,119 +4,245 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-import json
+import functools
 import sys
+from collections import namedtuple
 
-prefix = "ZNS-sim/ACT"
+import numpy as np
+
+from component import Fab_Component, load_config
+
+GPAS = ("95", "97", "99")
+
+###############################
+# Gasses per unit area for a given abatement level ("95" | "97" | "99")
+###############################
+def get_gpa_config(gpa):
+    if gpa == "95":
+        gpa_config = load_config("logic/gpa_95.json")
+
+    elif gpa == "99":
+        gpa_config = load_config("logic/gpa_99.json")
+
+    elif gpa == "97":
+        gpa_95_config = load_config("logic/gpa_95.json")
+        gpa_99_config = load_config("logic/gpa_99.json")
+
+        gpa_config = {}
+        for c in gpa_95_config.keys():
+            gas = (gpa_95_config[c] + gpa_99_config[c]) / 2.
+            gpa_config[c] = gas
+
+    else:
+        print("Error: Unsupported GPA value for FAB logic")
+        sys.exit()
+
+    return gpa_config
+
+###############################
+# Carbon intensity of fab ("loc_<location>" | "src_<source>")
+###############################
+def get_fab_ci(carbon_intensity):
+    if "loc" in carbon_intensity:
+        loc_configs = load_config("carbon_intensity/location.json")
+
+        loc = carbon_intensity.replace("loc_", "")
+
+        assert loc in loc_configs.keys()
+
+        fab_ci = loc_configs[loc]
+
+    elif "src" in carbon_intensity:
+        src_configs = load_config("carbon_intensity/source.json")
+
+        src = carbon_intensity.replace("src_", "")
+
+        assert src in src_configs.keys()
+
+        fab_ci = src_configs[src]
+
+    else:
+        print("Error: Carbon intensity must either be loc | src dependent")
+        sys.exit()
+
+    return fab_ci
+
+class Fab_Logic(Fab_Component):
+    __slots__ = ("process_node", "gpa", "carbon_intensity", "fab_yield",
+                 "carbon_per_area")
 
-class Fab_Logic():
     def __init__(self, process_node=14,
                        gpa="97",
                        carbon_intensity="loc_taiwan",
                        debug=False,
                        fab_yield=0.875):
 
-        self.debug = debug
-
         ###############################
         # Energy per unit area
         ###############################
-        with open(f"{prefix}/logic/epa.json", 'r') as f:
-            epa_config = json.load(f)
+        epa_config = load_config("logic/epa.json")
 
         ###############################
         # Raw materials per unit area
         ###############################
-        with open(f"{prefix}/logic/materials.json", 'r') as f:
-            materials_config = json.load(f)
+        materials_config = load_config("logic/materials.json")
 
         ###############################
         # Gasses per unit area
         ###############################
-        if gpa == "95":
-            with open(f"{prefix}/logic/gpa_95.json", 'r') as f:
-                gpa_config = json.load(f)
-
-        elif gpa == "99":
-            with open(f"{prefix}/logic/gpa_99.json", 'r') as f:
-                gpa_config = json.load(f)
-
-        elif gpa == "97":
-            with open(f"{prefix}/logic/gpa_95.json", 'r') as f:
-                gpa_95_config = json.load(f)
-            with open(f"{prefix}/logic/gpa_99.json", 'r') as f:
-                gpa_99_config = json.load(f)
-
-            gpa_config = {}
-            for c in gpa_95_config.keys():
-                gas = (gpa_95_config[c] + gpa_99_config[c]) / 2.
-                gpa_config[c] = gas
-
-        else:
-            print("Error: Unsupported GPA value for FAB logic")
-            sys.exit()
+        gpa_config = get_gpa_config(gpa)
 
         ###############################
         # Carbon intensity of fab
         ###############################
-        if "loc" in carbon_intensity:
-            with open(f"{prefix}/carbon_intensity/location.json", 'r') as f:
-                loc_configs = json.load(f)
-
-                loc = carbon_intensity.replace("loc_", "")
-
-                assert loc in loc_configs.keys()
-
-                fab_ci = loc_configs[loc]
-
-        elif "src" in carbon_intensity:
-            with open(f"{prefix}/carbon_intensity/source.json", 'r') as f:
-                src_configs = json.load(f)
-
-                src = carbon_intensity.replace("src_", "")
-
-                assert src in src_configs.keys()
-
-                fab_ci = src_configs[src]
-
-        else:
-            print("Error: Carbon intensity must either be loc | src dependent")
-            sys.exit()
+        fab_ci = get_fab_ci(carbon_intensity)
 
         ###############################
         # Aggregating model
         ###############################
-        process_node = str(process_node) + "nm"
-        assert process_node in epa_config.keys()
-        assert process_node in gpa_config.keys()
-        assert process_node in materials_config.keys()
+        node = str(process_node) + "nm"
+        assert node in epa_config.keys()
+        assert node in gpa_config.keys()
+        assert node in materials_config.keys()
 
-        carbon_energy    = fab_ci * epa_config[process_node]
-        carbon_gas       = gpa_config[process_node]
-        carbon_materials = materials_config[process_node]
+        carbon_energy    = fab_ci * epa_config[node]
+        carbon_gas       = gpa_config[node]
+        carbon_materials = materials_config[node]
 
-        self.carbon_per_area = (carbon_energy + carbon_gas + carbon_materials)
-        self.carbon_per_area = self.carbon_per_area / fab_yield
+        carbon_per_area = (carbon_energy + carbon_gas + carbon_materials)
+        carbon_per_area = carbon_per_area / fab_yield
 
-        if self.debug:
+        if debug:
             print("[Fab logic] Carbon/area from energy consumed" , carbon_energy)
             print("[Fab logic] Carbon/area from gasses"          , carbon_gas)
             print("[Fab logic] Carbon/area from materials"       , carbon_materials)
-            print("[Fab logic] Carbon/area aggregate"            , self.carbon_per_area)
+            print("[Fab logic] Carbon/area aggregate"            , carbon_per_area)
 
-        self.carbon = 0
-
-        return
+        self._freeze(process_node     = process_node,
+                     gpa              = gpa,
+                     carbon_intensity = carbon_intensity,
+                     fab_yield        = fab_yield,
+                     carbon_per_area  = carbon_per_area)
 
 
     def get_cpa(self,):
         return self.carbon_per_area
 
-    def set_area(self, area):
-        self.area = area
-        self.carbon = self.area * self.carbon_per_area
-
-    def get_carbon(self, ):
-        return self.carbon
-
-
+    def carbon(self, area):
+        return self.carbon_per_area * area
+
+    def carbon_array(self, areas):
+        return self.carbon_per_area * np.asarray(areas, dtype=float)
+
+
+
+###############################
+# Carbon per area before dividing by fab yield
+###############################
+def get_carbon_per_area_numerator(process_node, gpa, carbon_intensity):
+    node = str(process_node) + "nm"
+    epa_config = load_config("logic/epa.json")
+    gpa_config = get_gpa_config(gpa)
+    materials_config = load_config("logic/materials.json")
+    assert node in epa_config.keys()
+    assert node in gpa_config.keys()
+    assert node in materials_config.keys()
+
+    carbon_energy = get_fab_ci(carbon_intensity) * epa_config[node]
+    return carbon_energy + gpa_config[node] + materials_config[node]
+
+###############################
+# Carbon per area (before dividing by fab yield) of every process node, gpa
+# level and fab intensity in the logic/ and carbon_intensity/ tables, as a
+# (node, gpa, intensity) cube. Built once per process; read-only.
+###############################
+CPACube = namedtuple("CPACube", ["nodes", "gpas", "carbon_intensities", "numerators"])
+
+@functools.lru_cache(maxsize=None)
+def get_cpa_cube():
+    epa_config = load_config("logic/epa.json")
+    materials_config = load_config("logic/materials.json")
+    gpa_configs = [get_gpa_config(gpa) for gpa in GPAS]
+    nodes = tuple(node for node in epa_config
+                  if node in materials_config and all(node in c for c in gpa_configs))
+    carbon_intensities = tuple(["loc_" + loc for loc in load_config("carbon_intensity/location.json")] +
+                               ["src_" + src for src in load_config("carbon_intensity/source.json")])
+
+    numerators = np.empty((len(nodes), len(GPAS), len(carbon_intensities)))
+    for i, node in enumerate(nodes):
+        for j, gpa in enumerate(GPAS):
+            for k, ci in enumerate(carbon_intensities):
+                numerators[i, j, k] = get_carbon_per_area_numerator(node[:-len("nm")], gpa, ci)
+    numerators.flags.writeable = False
+    return CPACube(nodes, GPAS, carbon_intensities, numerators)
+
+def get_cpa_grid(fab_yields):
+    # the cube with a trailing fab yield axis: (node, gpa, intensity, yield)
+    return get_cpa_cube().numerators[..., None] / np.asarray(fab_yields, dtype=float)
+
+def get_fab_ci_key(carbon_intensity):
+    # the cube entry get_fab_ci reads for a spelling, None when it has none
+    if "loc" in carbon_intensity:
+        key, configs = carbon_intensity.replace("loc_", ""), load_config("carbon_intensity/location.json")
+        return "loc_" + key if key in configs else None
+    if "src" in carbon_intensity:
+        key, configs = carbon_intensity.replace("src_", ""), load_config("carbon_intensity/source.json")
+        return "src_" + key if key in configs else None
+    return None
+
+def get_node_key(process_node):
+    return str(process_node) + "nm"
+
+def get_cpa_positions(keys, values, name, key=str, labels=None):
+    # position of key(value) in keys for every value; ValueError naming the
+    # first value outside the tables
+    distinct, inverse = np.unique(values, return_inverse=True)
+    index = {k: i for i, k in enumerate(keys)}
+    positions = []
+    for value in distinct.tolist():
+        if key(value) not in index:
+            raise ValueError(f"{name} {value!r} is not in the logic tables (valid: {', '.join(labels or keys)})")
+        positions.append(index[key(value)])
+    return np.array(positions, dtype=np.int64)[inverse.reshape(values.shape)]
+
+def get_cpa_indices(process_nodes=14, gpas="97", carbon_intensities="loc_taiwan"):
+    # integer (node, gpa, intensity) positions in get_cpa_cube(), for sweeps
+    # that index the cube directly
+    cube = get_cpa_cube()
+    return tuple(np.broadcast_arrays(
+        get_cpa_positions(cube.nodes, np.asarray(process_nodes), "process node", get_node_key,
+                           [node[:-len("nm")] for node in cube.nodes]),
+        get_cpa_positions(cube.gpas, np.asarray(gpas).astype(str), "gpa"),
+        get_cpa_positions(cube.carbon_intensities, np.asarray(carbon_intensities).astype(str),
+                          "carbon intensity", get_fab_ci_key)))
+
+def get_logic_carbon_indexed(areas, nodes, gpas, carbon_intensities, fab_yields=0.875):
+    # get_logic_carbon_batch with settings given as get_cpa_indices positions
+    numerators = get_cpa_cube().numerators
+    positions = np.broadcast_arrays(nodes, gpas, carbon_intensities)
+    for name, p, size in zip(("process node", "gpa", "carbon intensity"), positions, numerators.shape):
+        if p.size and (p.min() < 0 or p.max() >= size):
+            raise ValueError(f"{name} index outside [0, {size})")
+    areas = np.asarray(areas, dtype=float)
+    if areas.size and not (np.isfinite(areas).all() and areas.min() >= 0):
+        raise ValueError("die areas must be finite and non-negative")
+    carbon = np.take(numerators, np.ravel_multi_index(positions, numerators.shape)) / \
+             np.asarray(fab_yields, dtype=float) * areas
+    return carbon, carbon.sum(axis=-1)
+
+###############################
+# Batched logic model for device teardowns: one row per IC.
+# All inputs broadcast against each other (a leading axis can be used to
+# sweep assumptions for every IC at once). Areas are in cm^2.
+# Returns (per-IC carbon, total over the last axis), both in g CO2.
+# Settings outside the logic tables raise ValueError.
+###############################
+def get_logic_carbon_batch(areas, process_nodes=14, gpas="97",
+                           carbon_intensities="loc_taiwan", fab_yields=0.875):
+    areas, nodes, gpas, cis, fab_yields = np.broadcast_arrays(
+        np.asarray(areas, dtype=float),
+        np.asarray(process_nodes),
+        np.asarray(gpas).astype(str),
+        np.asarray(carbon_intensities).astype(str),
+        np.asarray(fab_yields, dtype=float))
+    return get_logic_carbon_indexed(areas, *get_cpa_indices(nodes, gpas, cis), fab_yields)
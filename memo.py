@@ -0,0 +1,69 @@
+import functools
+import threading
+from collections import OrderedDict
+
+# Opt-in memoization for the scalar carbon model functions
+# (dellrexp.get_embodied_carbon, operational.get_operational_carbon, ...).
+#
+#   embodied = Memo(get_embodied_carbon, maxsize=4096)
+#   embodied(dram, ssd)
+#   print(embodied.stats())
+#
+# Arguments are used as the key exactly: the model steps at ceil() of the
+# capacities (drives, dimms), so rounding floats could give 768 and
+# 768.0000000001 the same entry although they need a different number of
+# drives. The cache is a bounded LRU. Cached results are returned as-is, so
+# callers must not mutate them (get_operational_carbon returns a dict).
+
+DEFAULT_MAXSIZE = 4096
+
+class Memo():
+    def __init__(self, func, maxsize=DEFAULT_MAXSIZE):
+        assert maxsize > 0, "Memo maxsize must be positive"
+        functools.update_wrapper(self, func)
+        self.func    = func
+        self.maxsize = maxsize
+        self.cache   = OrderedDict()
+        self.lock    = threading.Lock()
+        self.hits    = 0
+        self.misses  = 0
+
+    def key(self, args, kwargs):
+        key = args
+        if kwargs:
+            key += tuple(sorted(kwargs.items()))
+        return key
+
+    def __call__(self, *args, **kwargs):
+        key = self.key(args, kwargs)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+
+        value = self.func(*args, **kwargs)
+
+        with self.lock:
+            self.cache[key] = value
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return value
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / calls if calls else 0.,
+            "size": len(self.cache),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
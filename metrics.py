@@ -0,0 +1,49 @@
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import numpy as np
+
+###############################
+# Carbon optimization metrics (see README). C is embodied carbon, D delay and
+# E energy; lower is better for all four.
+###############################
+METRICS = ("CDP", "CEP", "C2EP", "CE2P")
+
+def get_metrics(carbon, delay, energy):
+    # all four metrics for arrays of design points in one pass
+    c, d, e = np.broadcast_arrays(np.asarray(carbon, dtype=float),
+                                  np.asarray(delay, dtype=float),
+                                  np.asarray(energy, dtype=float))
+    ce = c * e
+    return {
+        "CDP":  c * d,
+        "CEP":  ce,
+        "C2EP": ce * c,
+        "CE2P": ce * e,
+    }
+
+def top_k(values, k):
+    # Indices of the k smallest values in ascending order. argpartition does
+    # the selection in O(n), so only the k winners are sorted.
+    values = np.asarray(values)
+    k = max(0, min(k, values.size))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < values.size:
+        idx = np.argpartition(values, k - 1)[:k]
+    else:
+        idx = np.arange(values.size)
+    return idx[np.argsort(values[idx], kind='stable')]
+
+def rank_design_points(carbon, delay, energy, k=10, metrics=METRICS):
+    # {metric: (indices, values)} of the k best design points per metric
+    values = get_metrics(carbon, delay, energy)
+    ranked = {}
+    for metric in metrics:
+        assert metric in values, f"Unknown carbon metric {metric}"
+        idx = top_k(values[metric].ravel(), k)
+        ranked[metric] = (idx, values[metric].ravel()[idx])
+    return ranked
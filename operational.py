@@ -1,4 +1,9 @@
 import math
+from collections import namedtuple
+
+import numpy as np
+
+import parallel
 
 energy_type_carbon = {
     "coal": 820,
@@ -29,9 +34,17 @@ flash_max_cap = 768 # gb
 cpu_power = 125
 dram_power = 3 # per 8 gb #5.6  per 64 gb ddr5
 dram_power_cap_gb = 8
+hdd_power = 7 # operating average, data sheet of Exos X16
+hdd_max_cap = 16000 # gb
 nic = 20
 usage_discount = .7
 
+def get_carbon_intensity(region):
+    # region is either a location or an energy source, as in get_operational_carbon
+    if region in location_carbon:
+        return location_carbon[region]
+    return energy_type_carbon[region]
+
 def get_kwh_per_year(powers):
     # take watts and return kwh per year
     return [p / 1000 * 8760 for p in powers]
@@ -49,3 +62,34 @@ def get_operational_carbon(dram_cap_gb, flash_cap_gb):
     ret = {**locations, **energy_types}
     return ret
     # return {k: sum(v) for (k, v) in ret.items()}
+
+
+def get_operational_carbon_batch(dram_cap_gb, flash_cap_gb, region):
+    # Same model as get_operational_carbon(...)[region] over arrays of
+    # capacities; returns arrays (flash, cpu, dram) in kg per year.
+    # Large batches can be split across worker processes (opt-in, see parallel.py).
+    dram = np.asarray(dram_cap_gb, dtype=float)
+    flash = np.asarray(flash_cap_gb, dtype=float)
+    dram, flash = np.broadcast_arrays(dram, flash)
+    if parallel.use_parallel(dram.size):
+        return parallel.map_shared(operational_carbon_kernel, (dram, flash), 3, (region,))
+    return operational_carbon_kernel(dram, flash, region)
+
+def operational_carbon_kernel(dram, flash, region):
+    kwh = get_kwh_per_year([t.watts for t in get_power_terms(dram, flash).values()])
+    return tuple(get_carbon_emissions(get_carbon_intensity(region), kwh))
+
+# The power of the batch model per component (flash, cpu, dram): watts, its
+# derivative in the component's capacity, and the piecewise-constant device
+# count the watts step with (flash drives). get_kwh_per_year and
+# get_carbon_emissions are linear, so they apply to the derivatives as well.
+PowerTerm = namedtuple("PowerTerm", ["watts", "watts_per_gb", "count"])
+
+def get_power_terms(dram, flash):
+    drives = np.ceil(flash / flash_max_cap)
+    ones = np.ones(dram.shape)
+    return {
+        "flash": PowerTerm(flash_power * drives, np.zeros(dram.shape), drives),
+        "cpu": PowerTerm(np.full(dram.shape, float(cpu_power)), np.zeros(dram.shape), ones),
+        "dram": PowerTerm(dram_power * dram / dram_power_cap_gb, np.full(dram.shape, dram_power / dram_power_cap_gb), ones),
+    }
@@ -0,0 +1,124 @@
+
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import atexit
+import multiprocessing
+import os
+
+try:
+    from multiprocessing import shared_memory
+except ImportError: # Python < 3.8
+    shared_memory = None
+
+import numpy as np
+
+###############################
+# Shared-memory backend for batched model evaluation.
+#
+# Inputs and outputs of a batch live in multiprocessing.shared_memory blocks;
+# each worker attaches to them by name, evaluates a contiguous slice in place
+# and detaches again, so no array is pickled in either direction. Only the
+# kernel, its scalar arguments and the slice bounds cross the process
+# boundary.
+#
+# Kernels take 1-d float64 input arrays (plus scalar args) and return a tuple
+# of n_outputs arrays of the same length; they must be module-level functions
+# so workers can look them up.
+#
+# Dispatch is opt-in: configure(threshold=...) turns it on for batches of at
+# least that many points. Copying into shared memory and back costs about as
+# much as the kernels themselves, so it only pays with several idle cores;
+# `python bench.py --crossover` measures the size where it starts to. With
+# one worker (or no shared_memory) batches are always evaluated in-process.
+# The worker pool is created on first use and reused until exit.
+###############################
+THRESHOLD = None # points; None: always evaluate in-process
+WORKERS = os.cpu_count() or 1
+POOL = None
+
+def configure(workers=None, threshold=None):
+    # threshold=0 dispatches every batch; configure(threshold=None) is a no-op,
+    # use disable() to turn dispatch off again
+    global WORKERS, THRESHOLD
+    if workers is not None:
+        assert workers >= 1, "workers must be >= 1"
+        if workers != WORKERS:
+            close_pool()
+        WORKERS = workers
+    if threshold is not None:
+        THRESHOLD = threshold
+
+def disable():
+    global THRESHOLD
+    THRESHOLD = None
+
+def use_parallel(size):
+    return shared_memory is not None and THRESHOLD is not None and WORKERS > 1 and size >= THRESHOLD
+
+def get_pool():
+    global POOL
+    if POOL is None:
+        POOL = multiprocessing.Pool(WORKERS)
+    return POOL
+
+@atexit.register
+def close_pool():
+    global POOL
+    if POOL is not None:
+        POOL.close()
+        POOL.join()
+        POOL = None
+
+def create_shared(size, values=None):
+    # float64 block of size elements, optionally filled with values
+    shm = shared_memory.SharedMemory(create=True, size=max(size * 8, 1))
+    if values is not None:
+        np.ndarray((size,), dtype=np.float64, buffer=shm.buf)[:] = values
+    return shm
+
+def evaluate_slice(kernel, args, input_names, output_names, size, start, stop):
+    # runs in a worker: attach, evaluate [start, stop) in place, detach
+    blocks = [shared_memory.SharedMemory(name=name) for name in input_names + output_names]
+    try:
+        arrays = [np.ndarray((size,), dtype=np.float64, buffer=block.buf) for block in blocks]
+        inputs, outputs = arrays[:len(input_names)], arrays[len(input_names):]
+        results = kernel(*[x[start:stop] for x in inputs], *args)
+        for out, result in zip(outputs, results):
+            out[start:stop] = result
+        del arrays, inputs, outputs
+    finally:
+        for block in blocks:
+            block.close()
+
+def map_shared(kernel, inputs, n_outputs, args=(), workers=None):
+    # Evaluates kernel over broadcast inputs across worker processes; returns
+    # a tuple of n_outputs arrays in the broadcast shape.
+    inputs = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in inputs])
+    shape = inputs[0].shape
+    size = inputs[0].size
+    workers = min(workers or WORKERS, max(size, 1)) # slices; the pool has WORKERS processes
+
+    blocks = []
+    try:
+        for x in inputs:
+            blocks.append(create_shared(size, x.ravel()))
+        for _ in range(n_outputs):
+            blocks.append(create_shared(size))
+        names = [shm.name for shm in blocks]
+        shared_inputs, shared_outputs = names[:len(inputs)], names[len(inputs):]
+
+        bounds = np.linspace(0, size, workers + 1).astype(int)
+        tasks = [(kernel, tuple(args), shared_inputs, shared_outputs, size, start, stop)
+                 for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+        get_pool().starmap(evaluate_slice, tasks)
+
+        # copy out so the blocks can be released
+        return tuple(np.ndarray((size,), dtype=np.float64, buffer=shm.buf).reshape(shape).copy()
+                     for shm in blocks[len(inputs):])
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from operational import location_carbon, get_carbon_intensity
+
+# Carbon-aware placement of batch jobs over hourly, per-region carbon
+# intensity traces.
+#
+# Each job has an arrival hour, a duration (whole hours), a power draw (kW),
+# a deadline hour by which it must finish and a home region. It runs
+# uninterrupted in one region on one of that region's `capacity` slots. The
+# baseline runs every job at arrival in its home region; the carbon-aware
+# placement picks the region and start hour minimizing power x the summed
+# intensity of the hours it runs.
+#
+#   1. Without capacity limits the best placement of every job is a
+#      sliding-window minimum: for duration d the cost of each start is a
+#      window sum of the trace (from prefix sums), and the best start in
+#      [arrival, deadline - d] is the minimum over a window of those sums.
+#      Jobs sharing (d, window) are answered together with one van
+#      Herk/Gil-Werman pass over all regions, O(regions x hours) per group.
+#   2. With capacity limits jobs are admitted in arrival order (then deadline)
+#      into their best placement; a job whose best placement has a full hour
+#      falls back to the cheapest start with a free slot in every hour, or is
+#      left unplaced. Unplaced jobs are counted at their baseline carbon.
+#
+# Traces are CSV files with an `hour` column and one g/kWh column per region;
+# jobs are CSV files with columns arrival, duration, power, deadline and an
+# optional region.
+#
+#   python placement.py --jobs jobs.csv --traces traces.csv --capacity 1000
+#   python placement.py --synthetic 1000000 --capacity 20000
+
+# jobs are arrays over jobs; home is an index into Traces.regions
+Jobs = namedtuple("Jobs", ["arrival", "duration", "power", "deadline", "home"])
+# intensity is (regions, hours) in g/kWh
+Traces = namedtuple("Traces", ["regions", "intensity"])
+
+DIRECT_LOOKUP = 1. # answer a group per job when jobs x window < this x hours
+
+def read_traces(paths):
+    regions, columns, hours = [], [], None
+    for path in paths:
+        with open(path, 'r', newline='') as f:
+            rows = list(csv.reader(f))
+        header, rows = rows[0], rows[1:]
+        if header[0] != "hour":
+            raise ValueError(f"{path}: first column must be hour")
+        values = np.array(rows, dtype=float)
+        if hours is None:
+            hours = values[:, 0]
+        elif not np.array_equal(hours, values[:, 0]):
+            raise ValueError(f"{path}: hours differ from {paths[0]}")
+        for i, region in enumerate(header[1:], start=1):
+            if region in regions:
+                raise ValueError(f"{path}: region {region} given twice")
+            regions.append(region)
+            columns.append(values[:, i])
+    if not np.array_equal(hours, np.arange(len(hours))):
+        raise ValueError("traces must cover hours 0, 1, 2, ... without gaps")
+    return Traces(regions, np.array(columns))
+
+def read_jobs(path, regions):
+    with open(path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    index = {region: i for i, region in enumerate(regions)}
+    try:
+        home = [index[row.get("region") or regions[0]] for row in rows]
+    except KeyError as e:
+        raise ValueError(f"{path}: job region {e} has no trace")
+    return make_jobs([row["arrival"] for row in rows], [row["duration"] for row in rows],
+                     [row["power"] for row in rows], [row["deadline"] for row in rows], home)
+
+def make_jobs(arrival, duration, power, deadline, home):
+    return Jobs(np.asarray(arrival, dtype=float).astype(np.int64),
+                np.ceil(np.asarray(duration, dtype=float)).astype(np.int64),
+                np.asarray(power, dtype=float),
+                np.asarray(deadline, dtype=float).astype(np.int64),
+                np.asarray(home, dtype=np.int64))
+
+def check_jobs(jobs, hours):
+    if (jobs.duration < 1).any():
+        raise ValueError("job durations must be at least one hour")
+    if (jobs.arrival < 0).any() or (jobs.arrival + jobs.duration > hours).any():
+        raise ValueError(f"jobs must arrive and run to completion within the {hours} hours of the traces")
+
+def synthetic_traces(regions, hours, rng):
+    # static intensity of each region with a diurnal dip (solar) at a random
+    # local noon and some hourly noise
+    base = np.array([get_carbon_intensity(region) for region in regions], dtype=float)[:, None]
+    noon = rng.uniform(0, 24, (len(regions), 1))
+    amplitude = rng.uniform(.1, .4, (len(regions), 1))
+    h = np.arange(hours)
+    diurnal = 1 - amplitude * np.cos(2 * np.pi * (h - noon) / 24)
+    return Traces(list(regions), base * diurnal * rng.normal(1, .05, (len(regions), hours)).clip(.5))
+
+def synthetic_jobs(n, traces, rng, max_duration=12, max_slack=48):
+    hours = traces.intensity.shape[1]
+    duration = rng.integers(1, max_duration + 1, n)
+    arrival = rng.integers(0, hours - duration + 1)
+    deadline = arrival + duration + rng.integers(0, max_slack + 1, n)
+    return make_jobs(arrival, duration, rng.uniform(.2, 2, n), deadline,
+                     rng.integers(0, len(traces.regions), n))
+
+def sliding_min(x, width):
+    # min and first argmin of every window x[..., i:i + width] along the last
+    # axis, in O(n) with van Herk/Gil-Werman block prefix/suffix minima
+    n = x.shape[-1]
+    lead = x.shape[:-1]
+    blocks = -(-n // width)
+    padded = np.concatenate([x, np.full(lead + (blocks * width - n,), np.inf)], axis=-1)
+    padded = padded.reshape(lead + (blocks, width))
+    j = np.arange(blocks * width).reshape(blocks, width)
+
+    prefix = np.minimum.accumulate(padded, axis=-1)
+    new_min = np.ones(padded.shape, dtype=bool)
+    new_min[..., 1:] = padded[..., 1:] < prefix[..., :-1]
+    prefix_arg = np.maximum.accumulate(np.where(new_min, j, -1), axis=-1)
+
+    suffix = np.minimum.accumulate(padded[..., ::-1], axis=-1)[..., ::-1]
+    at_min = np.where(padded == suffix, j, blocks * width)
+    suffix_arg = np.minimum.accumulate(at_min[..., ::-1], axis=-1)[..., ::-1]
+
+    count = n - width + 1
+    prefix, prefix_arg = prefix.reshape(lead + (-1,)), prefix_arg.reshape(lead + (-1,))
+    suffix, suffix_arg = suffix.reshape(lead + (-1,)), suffix_arg.reshape(lead + (-1,))
+    left, left_arg = suffix[..., :count], suffix_arg[..., :count]
+    right, right_arg = prefix[..., width - 1:width - 1 + count], prefix_arg[..., width - 1:width - 1 + count]
+    use_left = left <= right
+    return np.where(use_left, left, right), np.where(use_left, left_arg, right_arg)
+
+def window_sums(prefix, duration):
+    # (regions, starts) summed intensity of running `duration` hours from each start
+    return prefix[:, duration:] - prefix[:, :-duration]
+
+def latest_start(jobs, hours):
+    # jobs that cannot meet their deadline run at arrival
+    return np.maximum(np.minimum(jobs.deadline, hours) - jobs.duration, jobs.arrival)
+
+def best_placements(jobs, traces, migrate=True):
+    # region and start hour of the cheapest placement of every job, ignoring capacity
+    n_regions, hours = traces.intensity.shape
+    prefix = np.zeros((n_regions, hours + 1))
+    np.cumsum(traces.intensity, axis=1, out=prefix[:, 1:])
+    width = latest_start(jobs, hours) - jobs.arrival + 1
+
+    region = np.empty(len(jobs.arrival), dtype=np.int64)
+    start = np.empty(len(jobs.arrival), dtype=np.int64)
+    keys, group = np.unique(jobs.duration * (hours + 1) + width, return_inverse=True)
+    order = np.argsort(group, kind='stable')
+    bounds = np.searchsorted(group[order], np.arange(len(keys) + 1))
+    for k, key in enumerate(keys.tolist()):
+        members = order[bounds[k]:bounds[k + 1]]
+        duration, w = divmod(key, hours + 1)
+        sums = window_sums(prefix, duration)
+        arrival = jobs.arrival[members]
+        if len(members) * w < DIRECT_LOOKUP * hours:
+            candidates = arrival[:, None] + np.arange(w)
+            costs = sums[:, candidates] # (regions, jobs, w)
+            if not migrate:
+                costs = np.where(np.arange(n_regions)[:, None, None] == jobs.home[members][None, :, None], costs, np.inf)
+            flat = costs.transpose(1, 0, 2).reshape(len(members), -1).argmin(axis=1)
+            r, offset = np.divmod(flat, w)
+            region[members], start[members] = r, arrival + offset
+        else:
+            minimum, arg = sliding_min(sums, w)
+            costs = minimum[:, arrival] # (regions, jobs)
+            if not migrate:
+                costs = np.where(np.arange(n_regions)[:, None] == jobs.home[members][None, :], costs, np.inf)
+            r = costs.argmin(axis=0)
+            region[members], start[members] = r, arg[r, arrival]
+    return region, start, prefix
+
+def assign_with_capacity(jobs, traces, prefix, capacity, region, start, migrate=True):
+    # admit jobs in arrival order; returns (region, start, placed)
+    n_regions, hours = traces.intensity.shape
+    used = np.zeros((n_regions, hours), dtype=np.int32)
+    region, start = region.copy(), start.copy()
+    placed = np.ones(len(region), dtype=bool)
+    latest = latest_start(jobs, hours)
+    all_regions = np.arange(n_regions)
+
+    columns = [region, start, jobs.duration, jobs.arrival, latest, jobs.home]
+    order = np.lexsort((jobs.deadline, jobs.arrival))
+    for i, r, s, d, a, e, home in zip(order.tolist(), *[c[order].tolist() for c in columns]):
+        window = used[r, s:s + d]
+        if window.max() < capacity[r]:
+            window += 1
+            continue
+
+        # cheapest start with a free slot in every hour it runs
+        rows = all_regions if migrate else all_regions[home:home + 1]
+        costs = prefix[rows, a + d:e + d + 1] - prefix[rows, a:e + 1]
+        busy = sliding_window_view(used[rows, a:e + d], d, axis=-1).max(axis=-1) >= capacity[rows, None]
+        costs = np.where(busy, np.inf, costs)
+        best = int(costs.argmin())
+        row, offset = divmod(best, costs.shape[1])
+        if not np.isfinite(costs[row, offset]):
+            placed[i] = False
+            continue
+        region[i], start[i] = rows[row], a + offset
+        used[rows[row], a + offset:a + offset + d] += 1
+    return region, start, placed
+
+def job_carbon(jobs, prefix, region, start):
+    # kg per job: kW x g/kWh summed over the hours run
+    return jobs.power * (prefix[region, start + jobs.duration] - prefix[region, start]) / 1000.
+
+def simulate(jobs, traces, capacity=None, migrate=True):
+    # returns {column: array over jobs} with the baseline and chosen placement
+    check_jobs(jobs, traces.intensity.shape[1])
+    region, start, prefix = best_placements(jobs, traces, migrate)
+    placed = np.ones(len(region), dtype=bool)
+    if capacity is not None:
+        region, start, placed = assign_with_capacity(jobs, traces, prefix, capacity, region, start, migrate)
+    region = np.where(placed, region, jobs.home)
+    start = np.where(placed, start, jobs.arrival)
+
+    return {
+        "region": region,
+        "start": start,
+        "placed": placed,
+        "baseline": job_carbon(jobs, prefix, jobs.home, jobs.arrival),
+        "carbon": job_carbon(jobs, prefix, region, start),
+    }
+
+def parse_capacity(values, regions):
+    # ["N"] for every region or ["REGION=N", ...] (regions not listed are unlimited)
+    if not values:
+        return None
+    capacity = np.full(len(regions), np.iinfo(np.int32).max, dtype=np.int64)
+    for value in values:
+        region, _, count = value.rpartition("=")
+        if not region:
+            capacity[:] = int(count)
+        elif region in regions:
+            capacity[regions.index(region)] = int(count)
+        else:
+            raise ValueError(f"capacity given for unknown region {region}")
+    return capacity
+
+def write_placements(path, jobs, traces, out):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["job", "home", "arrival", "region", "start", "placed", "baseline", "carbon"])
+        regions = np.array(traces.regions, dtype=object)
+        writer.writerows(zip(range(len(jobs.arrival)), regions[jobs.home].tolist(), jobs.arrival.tolist(),
+                             regions[out["region"]].tolist(), out["start"].tolist(), out["placed"].tolist(),
+                             out["baseline"].tolist(), out["carbon"].tolist()))
+
+def report(jobs, traces, out, elapsed):
+    n = len(jobs.arrival)
+    energy = jobs.power * jobs.duration # kWh
+    baseline, carbon = out["baseline"].sum() / 1000, out["carbon"].sum() / 1000 # t
+    placed = out["placed"]
+    print(f"Jobs: {n}, {energy.sum() / 1000:.1f} MWh, placed {placed.sum()}, unplaced {n - placed.sum()}")
+    print(f"\tdeferred {np.mean(out['start'] > jobs.arrival):.1%}, "
+          f"moved to another region {np.mean(out['region'] != jobs.home):.1%}")
+    print(f"Baseline (at arrival, home region): {baseline:.2f} t CO2")
+    print(f"Carbon-aware placement: {carbon:.2f} t CO2")
+    print(f"Saved: {baseline - carbon:.2f} t CO2 ({1 - carbon / baseline:.1%})")
+    if all(region in location_carbon for region in traces.regions):
+        static = np.array([location_carbon[region] for region in traces.regions])
+        print(f"\tstatic intensities estimate the baseline at {(energy * static[jobs.home]).sum() / 1e6:.2f} t CO2")
+    print(f"Simulated in {elapsed:.1f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', help='job trace (csv)')
+    parser.add_argument('--traces', nargs='+', help='hourly intensity traces (csv)')
+    parser.add_argument('--synthetic', type=int, default=None, metavar='JOBS',
+                        help='generate JOBS jobs and traces for the regions of operational.py')
+    parser.add_argument('--hours', type=int, default=24 * 365) # length of synthetic traces
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--capacity', nargs='+', default=None, metavar='[REGION=]N',
+                        help='concurrent jobs per region (default: unlimited)')
+    parser.add_argument('--no_migrate', action='store_true', help='only shift jobs in time')
+    parser.add_argument('--output', default=None, help='write per-job placements (csv)')
+    args = parser.parse_args()
+
+    try:
+        rng = np.random.default_rng(args.seed)
+        if args.traces:
+            traces = read_traces(args.traces)
+        elif args.synthetic is not None:
+            traces = synthetic_traces(list(location_carbon), args.hours, rng)
+        else:
+            parser.error("give --traces (and --jobs) or --synthetic")
+        if args.jobs:
+            jobs = read_jobs(args.jobs, traces.regions)
+        elif args.synthetic is not None:
+            jobs = synthetic_jobs(args.synthetic, traces, rng)
+        else:
+            parser.error("give --jobs or --synthetic")
+        capacity = parse_capacity(args.capacity, traces.regions)
+
+        t = time.perf_counter()
+        out = simulate(jobs, traces, capacity, not args.no_migrate)
+        elapsed = time.perf_counter() - t
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+
+    report(jobs, traces, out, elapsed)
+    if args.output:
+        write_placements(args.output, jobs, traces, out)
@@ -4,43 +4,32 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-import json
-import sys
+import numpy as np
 
-prefix = "ZNS-sim/ACT"
+from component import Fab_Component, load_config
+
+class Fab_SSD(Fab_Component):
+    __slots__ = ("config", "fab_yield", "carbon_per_gb")
 
-class Fab_SSD():
     def __init__(self, config="nand_10nm", fab_yield=0.875):
         ###############################
         # Carbon per capacity
         ###############################
-        with open(f"{prefix}/ssd/ssd_hynix.json", 'r') as f:
-            ssd_config = json.load(f)
-
-        with open(f"{prefix}/ssd/ssd_seagate.json", 'r') as f:
-            ssd_config.update(json.load(f))
-
-        with open(f"{prefix}/ssd/ssd_western.json", 'r') as f:
-            ssd_config.update(json.load(f))
-
-        assert config in ssd_config.keys() and "SSD configuration not found"
+        ssd_config = {**load_config("ssd/ssd_hynix.json"),
+                      **load_config("ssd/ssd_seagate.json"),
+                      **load_config("ssd/ssd_western.json")}
 
-        self.fab_yield = fab_yield
+        assert config in ssd_config.keys(), "SSD configuration not found"
 
-        self.carbon_per_gb = ssd_config[config] / self.fab_yield
-        self.carbon        = 0
-        return
+        self._freeze(config        = config,
+                     fab_yield     = fab_yield,
+                     carbon_per_gb = ssd_config[config] / fab_yield)
 
     def get_cpg(self, ):
         return self.carbon_per_gb
 
-    def set_capacity(self, capacity):
-        self.capacity = capacity
-        self.carbon = self.carbon_per_gb * self.capacity
-
-        return
-
-    def get_carbon(self, ):
-        return self.carbon
-
+    def carbon(self, capacity):
+        return self.carbon_per_gb * capacity
 
+    def carbon_array(self, capacities):
+        return self.carbon_per_gb * np.asarray(capacities, dtype=float)
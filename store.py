@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import functools
+import json
+import math
+import operator
+import os
+import sys
+import time
+
+import numpy as np
+
+from metrics import top_k
+import sweep
+
+# Column store for sweep results with indexes on the axes, for repeated
+# filtered queries such as "min total carbon per location for ssd >= 3840 and
+# lifetime <= 6" without re-running the model.
+#
+# A store is a directory with one .npy file per column, memory-mapped on
+# open. Axis columns (dram, ssd, lifetime, location, density, ...) are held
+# as compact codes into a sorted dictionary of their values; result columns
+# as float64, plus total = embodied + operational when both exist.
+#
+# Indexes:
+#   - rows are clustered in lexicographic axis order (a sorted index over
+#     all axes). When every axis combination occurs exactly once (the case
+#     for complete sweeps) the store is dense: a metric column reshapes into
+#     a cube over the axes and a filter is a per-axis selection of codes, so
+#     a query only touches the selected cells.
+#   - each axis value has a packed bitmap of its rows, used to combine
+#     filters for stores that are not dense.
+#
+#   python store.py build results.store sweep.csv
+#   python store.py query results.store --where "ssd>=3840" "lifetime<=6" --min total --by location
+#   python store.py query results.store --where location=US,Europe --top 10 --metric total
+
+STORE_META = "store.json"
+OPERATORS = ["<=", ">=", "!=", "=", "<", ">"] # longest first for parsing
+READ_CHUNK = 100000 # csv rows parsed at a time
+TOP_K_BLOCK = 1024 # values per block minimum in smallest()
+
+def product(values):
+    # math.prod needs Python 3.8
+    return functools.reduce(operator.mul, values, 1)
+
+def encode(values):
+    # sorted dictionary and compact codes of an axis column
+    dictionary, codes = np.unique(np.asarray(values), return_inverse=True)
+    return dictionary, codes.astype(sweep.axis_dtype(dictionary))
+
+def build(path, columns, axes):
+    # writes a store at path from {column: array}; all other columns are metrics
+    n = len(columns[axes[0]])
+    metrics = [column for column in columns if column not in axes]
+    if "embodied" in metrics and "operational" in metrics and "total" not in metrics:
+        columns = {**columns, "total": np.asarray(columns["embodied"], dtype=float) +
+                                       np.asarray(columns["operational"], dtype=float)}
+        metrics.append("total")
+
+    dictionaries, codes = {}, {}
+    for axis in axes:
+        dictionaries[axis], codes[axis] = encode(columns[axis])
+    order = np.lexsort([codes[axis] for axis in axes[::-1]])
+    shape = [len(dictionaries[axis]) for axis in axes]
+
+    os.makedirs(path, exist_ok=True)
+    distinct = np.zeros(max(n - 1, 0), dtype=bool)
+    for axis in axes:
+        axis_codes = codes[axis][order]
+        distinct |= axis_codes[1:] != axis_codes[:-1]
+        np.save(os.path.join(path, f"{axis}.npy"), axis_codes)
+        np.save(os.path.join(path, f"{axis}.bitmap.npy"),
+                np.stack([np.packbits(axis_codes == code) for code in range(len(dictionaries[axis]))]))
+    for metric in metrics:
+        np.save(os.path.join(path, f"{metric}.npy"), np.asarray(columns[metric], dtype=float)[order])
+
+    meta = {
+        "rows": n,
+        "axes": list(axes),
+        "metrics": metrics,
+        "dictionaries": {axis: dictionaries[axis].tolist() for axis in axes},
+        "dense": n == product(shape) and bool(distinct.all()),
+    }
+    with open(os.path.join(path, STORE_META), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+def read_sweep_columns(paths):
+    # {column: array} of one or more sweep result files, without the index column
+    columns = {column: [] for column in sweep.COLUMNS[1:]}
+    for path in paths:
+        with open(path, 'r', newline='') as f:
+            if not f.readline().startswith(sweep.META_PREFIX):
+                raise ValueError(f"{path}: not a sweep result file")
+            reader = csv.reader(f)
+            if next(reader, None) != sweep.COLUMNS:
+                raise ValueError(f"{path}: unexpected column header")
+            while True:
+                rows = [row for _, row in zip(range(READ_CHUNK), reader)]
+                if not rows:
+                    break
+                fields = list(zip(*rows))[1:]
+                for column, values in zip(columns, fields):
+                    columns[column].append(np.array(values, dtype=object if column == "location" else float))
+    return {column: np.concatenate(chunks) if chunks else np.empty(0) for column, chunks in columns.items()}
+
+def parse_condition(text):
+    # "ssd>=3840" -> ("ssd", ">=", "3840"); "=" and "!=" take comma-separated lists
+    for op in OPERATORS:
+        axis, found, value = text.partition(op)
+        if found:
+            return axis.strip(), op, value.strip()
+    raise ValueError(f"condition {text!r} needs one of {' '.join(OPERATORS)}")
+
+def smallest(values, k):
+    # Indices of the k smallest values in ascending order. The k-th smallest
+    # block minimum bounds the k-th smallest value, so only the few values
+    # under that bound are ranked.
+    k = max(0, min(k, values.size))
+    blocks = values.size // TOP_K_BLOCK
+    if k == 0 or blocks < 4 * k:
+        return top_k(values, k)
+    block_min = values[:blocks * TOP_K_BLOCK].reshape(blocks, TOP_K_BLOCK).min(axis=1)
+    bound = np.partition(block_min, k - 1)[k - 1]
+    candidates = np.flatnonzero(values <= bound)
+    return candidates[top_k(values[candidates], k)]
+
+def unravel(index, shape):
+    return np.unravel_index(index, shape) if shape else ()
+
+class Store():
+    def __init__(self, path):
+        with open(os.path.join(path, STORE_META), 'r') as f:
+            meta = json.load(f)
+        self.path         = path
+        self.rows         = meta["rows"]
+        self.axes         = meta["axes"]
+        self.metrics      = meta["metrics"]
+        self.dictionaries = {axis: np.array(values) for axis, values in meta["dictionaries"].items()}
+        self.dense        = meta["dense"]
+        self.shape        = tuple(len(self.dictionaries[axis]) for axis in self.axes)
+        self.columns      = {}
+
+    def column(self, name):
+        if name not in self.columns:
+            self.columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+        return self.columns[name]
+
+    def allowed(self, axis, op, value):
+        # codes of the axis values satisfying `axis op value`
+        if axis not in self.dictionaries:
+            raise ValueError(f"unknown axis {axis} (axes: {', '.join(self.axes)})")
+        dictionary = self.dictionaries[axis]
+        numeric = dictionary.dtype.kind in "iuf"
+        if op in ("=", "!="):
+            values = value.split(",")
+            if numeric:
+                values = [float(v) for v in values]
+            match = np.isin(dictionary, values)
+            return np.flatnonzero(match if op == "=" else ~match)
+        if not numeric:
+            raise ValueError(f"{axis} only supports = and !=")
+        compare = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}[op]
+        return np.flatnonzero(compare(dictionary, float(value)))
+
+    def selection(self, where):
+        # allowed codes per axis for a list of (axis, op, value) conditions
+        selected = [np.arange(size) for size in self.shape]
+        for axis, op, value in where:
+            codes = self.allowed(axis, op, value)
+            i = self.axes.index(axis)
+            selected[i] = np.intersect1d(selected[i], codes)
+        return selected
+
+    def select(self, where):
+        # row indices matching every condition, via the bitmap indexes
+        mask = None
+        for axis, codes in zip(self.axes, self.selection(where)):
+            if len(codes) == len(self.dictionaries[axis]):
+                continue
+            bitmaps = self.column(f"{axis}.bitmap")
+            axis_mask = np.bitwise_or.reduce(bitmaps[codes], axis=0) if len(codes) else \
+                        np.zeros(bitmaps.shape[1], dtype=np.uint8)
+            mask = axis_mask if mask is None else mask & axis_mask
+        if mask is None:
+            return np.arange(self.rows)
+        return np.flatnonzero(np.unpackbits(mask, count=self.rows))
+
+    def cube(self, metric, selected):
+        # dense stores: the metric over the selected codes, one dimension per
+        # axis; contiguous selections (all ranges) stay views of the column
+        sub = np.asarray(self.column(metric)).reshape(self.shape)
+        index = []
+        for codes in selected:
+            contiguous = len(codes) > 0 and codes[-1] - codes[0] + 1 == len(codes)
+            index.append(slice(codes[0], codes[-1] + 1) if contiguous else slice(None))
+        sub = sub[tuple(index)]
+        for i, (codes, where) in enumerate(zip(selected, index)):
+            if where == slice(None) and len(codes) != self.shape[i]:
+                sub = np.take(sub, codes, axis=i)
+        return sub
+
+    def group_min(self, metric, by, where=()):
+        # [(value of by, row, min metric)] over the rows matching where; ties
+        # go to the first row
+        self.check_metric(metric)
+        b = self.axes.index(by)
+        if self.dense:
+            selected = self.selection(where)
+            sub = self.cube(metric, selected)
+            if sub.size == 0:
+                return []
+            # (before, group, after) view; the first minimum of each group is
+            # found from where the group minimum occurs
+            x = sub.reshape(product(sub.shape[:b]), sub.shape[b], -1)
+            group = np.arange(sub.shape[b])
+            mins = x.min(axis=(0, 2))
+            at_min = x == mins[None, :, None]
+            before = at_min.any(axis=2).argmax(axis=0)
+            after = at_min[before, group].argmax(axis=1)
+            codes = [codes[i] for codes, i in zip(selected[:b], unravel(before, sub.shape[:b]))] + \
+                    [selected[b]] + \
+                    [codes[i] for codes, i in zip(selected[b + 1:], unravel(after, sub.shape[b + 1:]))]
+            rows = np.ravel_multi_index(codes, self.shape)
+            values, groups = mins, selected[b]
+        else:
+            rows = self.select(where)
+            values = self.column(metric)[rows]
+            group_codes = self.column(by)[rows]
+            order = np.argsort(group_codes, kind='stable')
+            group_codes, values, rows = group_codes[order], values[order], rows[order]
+            starts = np.flatnonzero(np.diff(group_codes, prepend=group_codes[:1] + 1) != 0) \
+                     if len(rows) else np.empty(0, dtype=np.intp)
+            mins = np.minimum.reduceat(values, starts) if len(starts) else values[:0]
+            ends = np.append(starts[1:], len(rows))
+            first = [start + int(np.argmax(values[start:end] == value))
+                     for start, end, value in zip(starts.tolist(), ends.tolist(), mins.tolist())]
+            rows, values, groups = rows[first], mins, group_codes[starts]
+        dictionary = self.dictionaries[by]
+        return [(dictionary[g].item(), int(r), float(v)) for g, r, v in zip(groups, rows, values)]
+
+    def top_k(self, metric, k, where=()):
+        # [(row, metric)] of the k smallest values over the rows matching where
+        self.check_metric(metric)
+        if self.dense:
+            selected = self.selection(where)
+            sub = self.cube(metric, selected)
+            values = sub.ravel()
+            idx = smallest(values, k)
+            codes = [codes[i] for codes, i in zip(selected, np.unravel_index(idx, sub.shape))]
+            rows = np.ravel_multi_index(codes, self.shape)
+            values = values[idx]
+        else:
+            rows = self.select(where)
+            values = self.column(metric)[rows]
+            idx = smallest(values, k)
+            rows, values = rows[idx], values[idx]
+        return [(int(r), float(v)) for r, v in zip(rows, values)]
+
+    def row(self, i):
+        out = {axis: self.dictionaries[axis][self.column(axis)[i]].item() for axis in self.axes}
+        out.update({metric: float(self.column(metric)[i]) for metric in self.metrics})
+        return out
+
+    def check_metric(self, metric):
+        if metric not in self.metrics:
+            raise ValueError(f"unknown metric {metric} (metrics: {', '.join(self.metrics)})")
+
+def format_value(value):
+    return sweep.number(value) if isinstance(value, float) else value
+
+def format_row(row):
+    return ", ".join(f"{k}={format_value(v)}" for k, v in row.items())
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='build a store from sweep result files')
+    build_parser.add_argument('store')
+    build_parser.add_argument('results', nargs='+')
+
+    query_parser = subparsers.add_parser('query', help='filtered group-by-min or top-k query')
+    query_parser.add_argument('store')
+    query_parser.add_argument('--where', nargs='+', default=[], metavar='AXIS<OP>VALUE',
+                              help='conditions, e.g. "ssd>=3840" lifetime=3,6 (all must hold)')
+    query_parser.add_argument('--min', metavar='METRIC', help='minimum of METRIC per --by group')
+    query_parser.add_argument('--by', metavar='AXIS')
+    query_parser.add_argument('--top', type=int, metavar='K', help='K rows with the smallest --metric')
+    query_parser.add_argument('--metric', default='total')
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'build':
+            columns = read_sweep_columns(args.results)
+            meta = build(args.store, columns, ["dram", "ssd", "lifetime", "location"])
+            print(f"Built {args.store}: {meta['rows']} rows, {'dense' if meta['dense'] else 'sparse'}")
+            return
+
+        if (args.min is None) == (args.top is None) or (args.min is not None and args.by is None):
+            parser.error("query needs either --min METRIC --by AXIS or --top K")
+        store = Store(args.store)
+        where = [parse_condition(condition) for condition in args.where]
+        start = time.perf_counter()
+        if args.min is not None:
+            if args.by not in store.axes:
+                raise ValueError(f"unknown axis {args.by} (axes: {', '.join(store.axes)})")
+            results = store.group_min(args.min, args.by, where)
+            rows = [(row, f"{args.by}={format_value(group)}: min {args.min} {value}") for group, row, value in results]
+        else:
+            results = store.top_k(args.metric, args.top, where)
+            rows = [(row, f"{rank + 1}: {args.metric} {value}") for rank, (row, value) in enumerate(results)]
+        elapsed = time.perf_counter() - start
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+
+    for row, text in rows:
+        print(f"{text}\t({format_row(store.row(row))})")
+    print(f"{len(rows)} results in {elapsed * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
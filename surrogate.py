@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+# Surrogate of total server carbon per year over (dram, ssd, lifetime,
+# location, density), for answering dashboard queries without loading the
+# model. The exact model is the one of sweep.py / fw_experiments.py:
+#   embodied(dram + dram/8, ssd') / lifetime + operational(dram, ssd', location)
+# with ssd' = ssd * the density's cost/sustainability factor.
+#
+# Lifetime and location enter the model in closed form (embodied / lifetime,
+# operational = intensity * operational at 1 g/kWh), and embodied and
+# operational carbon are sums of a dram term and an ssd term. So the
+# surrogate is four 1-d piecewise-linear tables, embodied and operational
+# against dram and against ssd, combined as
+#   (E_dram(dram) + E_ssd(ssd')) / lifetime + intensity * (O_dram(dram) + O_ssd(ssd'))
+#
+# Tables are built by sampling the full model and refining adaptively: a
+# cell whose interpolation misses the model by more than --tolerance at its
+# quarter points is split at its midpoint, down to adjacent floats, so the
+# math.ceil steps (dram modules, flash drives) end up between two knots with
+# no float in between. Knots that interpolation does not need are then
+# pruned.
+#
+# Between those steps every table's model term is linear, so a cell whose
+# ends lie in the same linear piece (or with no float inside) is exact up to
+# its corner values. error_bound() takes the pieces from the batch model's
+# own piecewise-constant factors (dellrexp.get_embodied_terms,
+# operational.get_power_terms), checks every cell against them and the term
+# for linearity within them, and bounds the total from the corner errors. The bound is for exact arithmetic;
+# floating-point rounding comes on top. The largest error sampled against the
+# exact model (random points over the whole space, both sides of every knot)
+# is recorded as well, and build refuses to save when either exceeds
+# --tolerance. Queries only need numpy and the artifact.
+#
+#   python surrogate.py build carbon_surrogate.npz
+#   python surrogate.py query carbon_surrogate.npz --dram 256 --ssd 7680 --lifetime 5 --location US --density QLC
+
+TABLES = ("embodied_dram", "embodied_ssd", "operational_dram", "operational_ssd")
+DRAM_RANGE = (0., 2048.) # GB, without ECC
+SSD_RANGE = (0., 65536.) # GB after the density factor, covers the fw_experiments scenarios
+LIFETIME_RANGE = (1., 10.) # years
+TOLERANCE = 1e-6 # kg CO2/year
+INITIAL_KNOTS = 65
+MAX_KNOTS = 1 << 20 # per table, before pruning
+CHECK_POINTS = 1000000
+
+###############################
+# Exact model
+###############################
+def get_model():
+    # model modules are only imported to build or check a surrogate
+    from dellrexp import get_embodied_carbon_batch
+    from operational import get_operational_carbon_batch, get_carbon_intensity, \
+        location_carbon, energy_type_carbon
+    from fw_experiments import DENSITIES
+    return get_embodied_carbon_batch, get_operational_carbon_batch, get_carbon_intensity, \
+        list(location_carbon) + list(energy_type_carbon), DENSITIES
+
+def exact_total(dram, ssd, lifetime, locations, density_mods):
+    # kg CO2/year per point; locations are names, density_mods the ssd factors
+    embodied_batch, operational_batch, _, _, _ = get_model()
+    dram, ssd, lifetime, locations, density_mods = np.broadcast_arrays(
+        np.asarray(dram, dtype=float), np.asarray(ssd, dtype=float), np.asarray(lifetime, dtype=float),
+        np.asarray(locations), np.asarray(density_mods, dtype=float))
+    ssd = ssd * density_mods
+    total = sum(embodied_batch(dram + dram/8, ssd)) / lifetime
+    for location in np.unique(locations).tolist():
+        at = locations == location
+        total[at] += sum(operational_batch(dram[at], ssd[at], location))
+    return total
+
+def model_terms():
+    # (embodied over the lifetime, operational per year at 1 g/kWh), split
+    # into the parts that depend on dram alone and on ssd alone
+    embodied_batch, operational_batch, get_carbon_intensity, _, _ = get_model()
+    reference = "US"
+    scale = get_carbon_intensity(reference)
+    base_embodied = sum(embodied_batch(np.zeros(1), np.zeros(1)))
+    base_operational = sum(operational_batch(np.zeros(1), np.zeros(1), reference)) / scale
+    return {
+        "embodied_dram": lambda d: sum(embodied_batch(d + d/8, np.zeros_like(d))),
+        "embodied_ssd": lambda s: sum(embodied_batch(np.zeros_like(s), s)) - base_embodied,
+        "operational_dram": lambda d: sum(operational_batch(d, np.zeros_like(d), reference)) / scale,
+        "operational_ssd": lambda s: sum(operational_batch(np.zeros_like(s), s, reference)) / scale - base_operational,
+    }
+
+def model_pieces():
+    # the linear pieces of each model term, as keys per capacity: one column
+    # per piecewise-constant factor of the batch model (module counts and
+    # component presence of dellrexp.get_embodied_terms, the flash drive
+    # count of operational.get_power_terms). A term is linear wherever none
+    # of them changes.
+    from dellrexp import get_embodied_terms
+    from operational import get_power_terms
+    def embodied(dram, ssd):
+        return np.stack([x for t in get_embodied_terms(dram, ssd).values() for x in (t.count, t.present)], axis=-1)
+    def operational(dram, ssd):
+        return np.stack([t.count for t in get_power_terms(dram, ssd).values()], axis=-1)
+    return {
+        "embodied_dram": lambda d: embodied(d + d/8, np.zeros_like(d)),
+        "embodied_ssd": lambda s: embodied(np.zeros_like(s), s),
+        "operational_dram": lambda d: operational(d, np.zeros_like(d)),
+        "operational_ssd": lambda s: operational(np.zeros_like(s), s),
+    }
+
+###############################
+# Adaptive piecewise-linear tables
+###############################
+def cell_errors(f, left, right, f_left, f_right):
+    # largest interpolation error at the quarter points of every cell
+    quarters = left[:, None] + (right - left)[:, None] * np.array([.25, .5, .75])
+    with np.errstate(over='ignore', invalid='ignore'): # steps: cells one float wide
+        approx = f_left[:, None] + (f_right - f_left)[:, None] * ((quarters - left[:, None]) / (right - left)[:, None])
+    return np.abs(approx - f(quarters.ravel()).reshape(quarters.shape)).max(axis=1)
+
+def refine(f, lo, hi, tolerance, initial=INITIAL_KNOTS):
+    # knots and values of a piecewise-linear interpolant of f on [lo, hi];
+    # only the cells split in the last round are tested again
+    knots = [np.linspace(lo, hi, initial)]
+    values = [f(knots[0])]
+    left, right = knots[0][:-1], knots[0][1:]
+    f_left, f_right = values[0][:-1], values[0][1:]
+    count = initial
+    while len(left):
+        mid = (left + right) / 2
+        splittable = (mid > left) & (mid < right) # a float inside the cell
+        bad = splittable & (cell_errors(f, left, right, f_left, f_right) > tolerance)
+        left, right, mid, f_left, f_right = left[bad], right[bad], mid[bad], f_left[bad], f_right[bad]
+        count += len(mid)
+        if count > MAX_KNOTS:
+            raise ValueError(f"more than {MAX_KNOTS} knots for table tolerance {tolerance:g}, "
+                             "below the model's rounding error?")
+        f_mid = f(mid)
+        knots.append(mid)
+        values.append(f_mid)
+        left, right = np.concatenate([left, mid]), np.concatenate([mid, right])
+        f_left, f_right = np.concatenate([f_left, f_mid]), np.concatenate([f_mid, f_right])
+    knots, values = np.concatenate(knots), np.concatenate(values)
+    order = np.argsort(knots, kind='stable')
+    return knots[order], values[order]
+
+def prune(f, knots, values, tolerance):
+    # drop knots whose neighbours interpolate f within tolerance (at the knot
+    # and 7 points across the merged cell); every other candidate per round,
+    # so the merged cells never overlap
+    fractions = np.linspace(0, 1, 9)[1:-1]
+    while len(knots) > 2:
+        inner = np.arange(1, len(knots) - 1)
+        removed = False
+        for parity in (0, 1):
+            candidates = inner[inner % 2 == parity]
+            left, right = knots[candidates - 1], knots[candidates + 1]
+            t = np.column_stack([knots[candidates], left[:, None] + (right - left)[:, None] * fractions])
+            with np.errstate(over='ignore', invalid='ignore'): # steps: cells one float wide
+                slope = (values[candidates + 1] - values[candidates - 1]) / (right - left)
+                approx = values[candidates - 1, None] + slope[:, None] * (t - left[:, None])
+                ok = np.abs(approx - f(t.ravel()).reshape(t.shape)).max(axis=1) <= tolerance
+            if ok.any():
+                keep = np.ones(len(knots), dtype=bool)
+                keep[candidates[ok]] = False
+                knots, values = knots[keep], values[keep]
+                removed = True
+                break
+        if not removed:
+            break
+    return knots, values
+
+def build(dram_range=DRAM_RANGE, ssd_range=SSD_RANGE, lifetime_range=LIFETIME_RANGE,
+          tolerance=TOLERANCE, check_points=CHECK_POINTS, seed=0):
+    _, _, get_carbon_intensity, locations, densities = get_model()
+    terms = model_terms()
+    # the tables' errors add up, and operational ones are scaled by the
+    # largest intensity and embodied ones divided by the shortest lifetime
+    max_intensity = max(get_carbon_intensity(location) for location in locations)
+    table_tolerance = {
+        "embodied_dram": tolerance / 4 * lifetime_range[0],
+        "embodied_ssd": tolerance / 4 * lifetime_range[0],
+        "operational_dram": tolerance / 4 / max_intensity,
+        "operational_ssd": tolerance / 4 / max_intensity,
+    }
+    tables = {}
+    for name in TABLES:
+        lo, hi = dram_range if name.endswith("dram") else ssd_range
+        knots, values = refine(terms[name], lo, hi, table_tolerance[name])
+        tables[name] = prune(terms[name], knots, values, table_tolerance[name])
+
+    surrogate = Surrogate(tables, {
+        "dram_range": list(dram_range),
+        "ssd_range": list(ssd_range),
+        "lifetime_range": list(lifetime_range),
+        "intensities": {location: float(get_carbon_intensity(location)) for location in locations},
+        "densities": {name: float(mods[1]) for name, mods in densities.items()},
+        "tolerance": tolerance,
+    })
+    surrogate.meta["error_bound"] = error_bound(surrogate)
+    surrogate.meta["max_sampled_error"], surrogate.meta["check_points"] = sample_error(surrogate, check_points, seed)
+    for name in ("error_bound", "max_sampled_error"):
+        if surrogate.meta[name] > tolerance:
+            raise ValueError(f"surrogate {name.replace('_', ' ')} {surrogate.meta[name]:.3g} "
+                             f"exceeds tolerance {tolerance:g}")
+    return surrogate
+
+def error_bound(surrogate):
+    # Bound on |surrogate - exact| (kg CO2/year) over the whole space. Within
+    # a cell the model term and the interpolant are both linear, so their
+    # difference is largest at a corner; total = table errors / lifetime +
+    # intensity * table errors is then largest at the shortest lifetime and
+    # the highest intensity.
+    terms, pieces = model_terms(), model_pieces()
+    errors = {}
+    for name, (knots, values) in surrogate.tables.items():
+        left, right = knots[:-1], knots[1:]
+        inside = np.nextafter(left, np.inf) < right # a float strictly inside the cell
+        spans = inside & (pieces[name](left) != pieces[name](right)).any(axis=-1)
+        if spans.any():
+            raise ValueError(f"{name}: cell [{float(left[spans][0])!r}, {float(right[spans][0])!r}] spans a step of the model")
+        exact = terms[name](knots)
+        # the pieces come from the model's own factors; check that the term
+        # really is linear within them (midpoints, up to rounding)
+        mid = (left + right)[inside] / 2
+        chord = (exact[:-1] + exact[1:])[inside] / 2
+        rounding = 64 * np.finfo(float).eps * max(float(np.abs(exact).max()), 1.)
+        bent = np.abs(terms[name](mid) - chord) > rounding
+        if bent.any():
+            raise ValueError(f"{name}: model term is not linear around {float(mid[bent][0])!r} within a piece")
+        errors[name] = float(np.abs(values - exact).max())
+    meta = surrogate.meta
+    return (errors["embodied_dram"] + errors["embodied_ssd"]) / meta["lifetime_range"][0] + \
+           max(meta["intensities"].values()) * (errors["operational_dram"] + errors["operational_ssd"])
+
+def sample_error(surrogate, n, seed=0):
+    # largest |surrogate - exact| over n random points and both sides of
+    # every knot (crossed with random values of the other axes)
+    rng = np.random.default_rng(seed)
+    meta = surrogate.meta
+    locations = np.array(list(meta["intensities"]))
+    densities = np.array(list(meta["densities"]))
+    dram = [rng.uniform(*meta["dram_range"], n)]
+    ssd = [rng.uniform(*meta["ssd_range"], n)]
+    for name in ("dram", "ssd"):
+        lo, hi = meta[f"{name}_range"]
+        knots = np.concatenate([surrogate.tables[f"embodied_{name}"][0], surrogate.tables[f"operational_{name}"][0]])
+        edges = np.clip(np.concatenate([knots, np.nextafter(knots, -np.inf), np.nextafter(knots, np.inf)]), lo, hi)
+        other = rng.uniform(*meta["ssd_range" if name == "dram" else "dram_range"], len(edges))
+        dram.append(edges if name == "dram" else other)
+        ssd.append(other if name == "dram" else edges)
+    dram, ssd = np.concatenate(dram), np.concatenate(ssd)
+    # ssd points are physical capacities; query them at the density that
+    # reaches them (TLC's factor is 1)
+    m = len(dram)
+    density = densities[rng.integers(0, len(densities), m)]
+    mods = np.array([meta["densities"][d] for d in density.tolist()])
+    ssd = ssd / mods
+    lifetime = rng.uniform(*meta["lifetime_range"], m)
+    location = locations[rng.integers(0, len(locations), m)]
+    error = np.abs(surrogate.total(dram, ssd, lifetime, location, density) -
+                   exact_total(dram, ssd, lifetime, location, mods))
+    return float(error.max()), m
+
+###############################
+# Artifact
+###############################
+class Surrogate():
+    def __init__(self, tables, meta):
+        self.tables = tables # name: (knots, values)
+        self.meta = meta
+
+    def save(self, path):
+        arrays = {}
+        for name, (knots, values) in self.tables.items():
+            arrays[f"{name}_knots"] = knots
+            arrays[f"{name}_values"] = values
+        np.savez_compressed(path, meta=np.array(json.dumps(self.meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            tables = {name: (data[f"{name}_knots"], data[f"{name}_values"]) for name in TABLES}
+            return cls(tables, json.loads(str(data["meta"])))
+
+    def codes(self, names, keys, axis):
+        names = np.asarray(names)
+        distinct, inverse = np.unique(names, return_inverse=True)
+        values = []
+        for name in distinct.tolist():
+            if name not in keys:
+                raise ValueError(f"unknown {axis} {name!r} (known: {', '.join(keys)})")
+            values.append(keys[name])
+        return np.array(values, dtype=float)[inverse.reshape(names.shape)]
+
+    def total(self, dram, ssd, lifetime, location, density="TLC"):
+        # kg CO2/year; dram without ECC and ssd before the density factor, GB
+        dram, ssd, lifetime = (np.asarray(x, dtype=float) for x in (dram, ssd, lifetime))
+        intensity = self.codes(location, self.meta["intensities"], "location")
+        ssd = ssd * self.codes(density, self.meta["densities"], "density")
+        # the ssd range is that of the tables, so it applies to the capacity
+        # after the density factor, not to the value passed in
+        for name, x, label in (("dram", dram, "dram"), ("ssd", ssd, "ssd after the density factor"),
+                               ("lifetime", lifetime, "lifetime")):
+            lo, hi = self.meta[f"{name}_range"]
+            if x.size and (x.min() < lo or x.max() > hi):
+                raise ValueError(f"{label} outside the surrogate's range [{lo:g}, {hi:g}]")
+        t = self.tables
+        embodied = np.interp(dram, *t["embodied_dram"]) + np.interp(ssd, *t["embodied_ssd"])
+        operational = np.interp(dram, *t["operational_dram"]) + np.interp(ssd, *t["operational_ssd"])
+        return embodied / lifetime + intensity * operational
+
+    def knots(self):
+        return sum(len(knots) for knots, _ in self.tables.values())
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='fit a surrogate and bound its error')
+    build_parser.add_argument('artifact')
+    build_parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='kg CO2/year')
+    build_parser.add_argument('--max-dram', type=float, default=DRAM_RANGE[1])
+    build_parser.add_argument('--max-ssd', type=float, default=SSD_RANGE[1],
+                              help='GB, after the density factor')
+    build_parser.add_argument('--lifetimes', type=float, nargs=2, default=LIFETIME_RANGE, metavar=('MIN', 'MAX'))
+    build_parser.add_argument('--check-points', type=int, default=CHECK_POINTS)
+
+    query_parser = subparsers.add_parser('query', help='total carbon per year from a surrogate')
+    query_parser.add_argument('artifact')
+    query_parser.add_argument('--dram', type=float, nargs='+', required=True)
+    query_parser.add_argument('--ssd', type=float, nargs='+', required=True)
+    query_parser.add_argument('--lifetime', type=float, nargs='+', required=True)
+    query_parser.add_argument('--location', nargs='+', required=True)
+    query_parser.add_argument('--density', nargs='+', default=['TLC'])
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'build':
+            start = time.perf_counter()
+            surrogate = build((DRAM_RANGE[0], args.max_dram), (SSD_RANGE[0], args.max_ssd),
+                              tuple(args.lifetimes), args.tolerance, args.check_points)
+            surrogate.save(args.artifact)
+            print(f"Built {args.artifact}: {surrogate.knots()} knots in {time.perf_counter() - start:.1f} s, "
+                  f"error bound {surrogate.meta['error_bound']:.3g} kg CO2/year (exact arithmetic), "
+                  f"max sampled error {surrogate.meta['max_sampled_error']:.3g} on "
+                  f"{surrogate.meta['check_points']} points (tolerance {args.tolerance:g})")
+            return
+
+        start = time.perf_counter()
+        surrogate = Surrogate.load(args.artifact)
+        loaded = time.perf_counter()
+        grid = np.meshgrid(args.dram, args.ssd, args.lifetime, args.location, args.density, indexing='ij')
+        points = [x.ravel() for x in grid]
+        totals = surrogate.total(*points)
+        elapsed = time.perf_counter() - loaded
+    except (ValueError, OSError) as e:
+        sys.exit(f"Error: {e}")
+
+    for dram, ssd, lifetime, location, density, total in zip(*[x.tolist() for x in points], totals.tolist()):
+        print(f"dram {dram:g} GB, ssd {ssd:g} GB, lifetime {lifetime:g}, {location}, {density}: {total:.6f} kg CO2/year")
+    print(f"{len(totals)} points in {elapsed * 1000:.3f} ms (load {(loaded - start) * 1000:.1f} ms), "
+          f"error bound {surrogate.meta['error_bound']:.3g} kg CO2/year (exact arithmetic), "
+          f"max sampled error {surrogate.meta['max_sampled_error']:.3g}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import functools
+import hashlib
+import json
+import operator
+import os
+import sys
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+from dellrexp import get_embodied_carbon_batch
+from operational import get_operational_carbon_batch, location_carbon, energy_type_carbon
+
+# Sweep over the Dell R740-style server grid used in dellrexp.py. Every grid
+# point has a stable index (row-major over the axes below), so a grid can be
+# split into deterministic shards, evaluated on separate machines and merged.
+#
+#   python sweep.py run shard0.csv --shard 0/4
+#   ...
+#   python sweep.py run shard3.csv --shard 3/4
+#   python sweep.py merge sweep.csv shard0.csv shard1.csv shard2.csv shard3.csv
+#
+# Points are evaluated in chunks. After every chunk the rows are flushed to
+# disk and a checkpoint (<output>.ckpt) records the next point and the file
+# offset it ends at, so an interrupted run restarted with --resume truncates
+# any partial rows and continues from the last completed chunk. If the output
+# was removed or is shorter than the checkpointed offset, the shard starts over.
+#
+# Chunks are held as compact typed columns (axis indices plus float64, or
+# float32 with --float32, results). With --max-memory the chunk size is
+# derived from the budget and re-sized after every chunk from the peak
+# allocation tracemalloc observed; --memory-report prints the peak per stage.
+
+DRAM_CAPS = [32, 64, 128, 192, 1024] # GB
+SSD_CAPS = [1820, 3840, 7680] # GB
+LIFETIMES = [3, 6, 9] # years
+LOCATIONS = list(location_carbon) + list(energy_type_carbon)
+
+COLUMNS = ["index", "dram", "ssd", "lifetime", "location", "embodied", "operational"]
+META_PREFIX = "# sweep "
+CHUNK_SIZE = 10000 # points evaluated between checkpoints
+BYTES_PER_POINT = 512 # initial guess of the peak allocation per point, refined while running
+BUDGET_HEADROOM = .8 # fraction of --max-memory a chunk is sized to use
+
+# one evaluated chunk; axis columns hold indices into the grid axes
+Chunk = namedtuple("Chunk", ["index", "dram", "ssd", "lifetime", "location", "embodied", "operational"])
+
+Grid = namedtuple("Grid", ["dram_caps", "ssd_caps", "lifetimes", "locations"])
+
+def grid_shape(grid):
+    return tuple(len(axis) for axis in grid)
+
+def grid_size(grid):
+    return functools.reduce(operator.mul, grid_shape(grid), 1)
+
+def grid_fingerprint(grid):
+    encoded = json.dumps(grid._asdict(), sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+def number(text):
+    # keep integral axis values as ints so the grid fingerprint does not
+    # depend on how a value was spelled on the command line
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+def parse_shard(spec):
+    # "i/N" with 0 <= i < N
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must satisfy 0 <= i < N, got {spec!r}")
+    return index, count
+
+def shard_range(size, shard):
+    # contiguous [start, stop) block of point indices owned by the shard
+    index, count = shard
+    return size * index // count, size * (index + 1) // count
+
+def axis_dtype(axis):
+    return np.min_scalar_type(max(len(axis) - 1, 0))
+
+def evaluate(grid, start, stop, dtype=np.float64):
+    # Chunk of points [start, stop): embodied/year and operational/year
+    d_idx, s_idx, l_idx, loc_idx = np.unravel_index(np.arange(start, stop), grid_shape(grid))
+
+    # embodied and operational carbon only depend on (dram, ssd), so they are
+    # evaluated once per pair of the (small) axes and gathered per point
+    dram, ssd = np.meshgrid(np.asarray(grid.dram_caps, dtype=float),
+                            np.asarray(grid.ssd_caps, dtype=float), indexing='ij')
+    dram_with_ecc = dram + dram/8
+    e_carbon = sum(get_embodied_carbon_batch(dram_with_ecc, ssd)) # over lifetime
+    o_carbon = np.stack([sum(get_operational_carbon_batch(dram, ssd, location))
+                         for location in grid.locations], axis=-1) # per year
+    lifetimes = np.asarray(grid.lifetimes, dtype=float)
+
+    return Chunk(
+        index = np.arange(start, stop, dtype=np.int64),
+        dram = d_idx.astype(axis_dtype(grid.dram_caps)),
+        ssd = s_idx.astype(axis_dtype(grid.ssd_caps)),
+        lifetime = l_idx.astype(axis_dtype(grid.lifetimes)),
+        location = loc_idx.astype(axis_dtype(grid.locations)),
+        embodied = (e_carbon[d_idx, s_idx] / lifetimes[l_idx]).astype(dtype),
+        operational = o_carbon[d_idx, s_idx, loc_idx].astype(dtype),
+    )
+
+def chunk_rows(grid, chunk):
+    # csv rows of a chunk, with axis values as given in the grid
+    axes = [np.array(axis, dtype=object) for axis in grid]
+    return zip(chunk.index.tolist(),
+               axes[0][chunk.dram].tolist(),
+               axes[1][chunk.ssd].tolist(),
+               axes[2][chunk.lifetime].tolist(),
+               axes[3][chunk.location].tolist(),
+               chunk.embodied.tolist(),
+               chunk.operational.tolist())
+
+def format_meta(grid, shard, dtype="float64"):
+    start, stop = shard_range(grid_size(grid), shard)
+    meta = {
+        "grid": grid._asdict(),
+        "fingerprint": grid_fingerprint(grid),
+        "points": grid_size(grid),
+        "shard": list(shard),
+        "range": [start, stop],
+        "dtype": dtype,
+    }
+    return META_PREFIX + json.dumps(meta) + "\n"
+
+def write_results(path, grid, shard, rows, dtype="float64"):
+    with open(path, 'w', newline='') as f:
+        f.write(format_meta(grid, shard, dtype))
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+def read_results(path):
+    # returns (meta, rows); rows are kept as the raw csv fields
+    with open(path, 'r', newline='') as f:
+        first = f.readline()
+        if not first.startswith(META_PREFIX):
+            raise ValueError(f"{path}: not a sweep result file")
+        meta = json.loads(first[len(META_PREFIX):])
+        reader = csv.reader(f)
+        if next(reader, None) != COLUMNS:
+            raise ValueError(f"{path}: unexpected column header")
+        rows = list(reader)
+    meta["grid"] = Grid(**meta["grid"])
+    meta.setdefault("dtype", "float64")
+    return meta, rows
+
+def check_shard(path, meta, rows):
+    start, stop = shard_range(meta["points"], tuple(meta["shard"]))
+    if meta["range"] != [start, stop]:
+        raise ValueError(f"{path}: shard range {meta['range']} does not match spec {meta['shard']}")
+    indices = [int(row[0]) for row in rows]
+    if indices != list(range(start, stop)):
+        raise ValueError(f"{path}: incomplete shard, expected points [{start}, {stop}) "
+                         f"but found {len(indices)} rows")
+
+def merge_results(output, paths):
+    shards = {}
+    fingerprint = count = None
+    for path in paths:
+        meta, rows = read_results(path)
+        index, this_count = meta["shard"]
+        if fingerprint is None:
+            fingerprint, count, grid, dtype = meta["fingerprint"], this_count, meta["grid"], meta["dtype"]
+        if meta["fingerprint"] != fingerprint:
+            raise ValueError(f"{path}: shard belongs to a different grid")
+        if meta["dtype"] != dtype:
+            raise ValueError(f"{path}: shard stores {meta['dtype']} results, expected {dtype}")
+        if this_count != count:
+            raise ValueError(f"{path}: shard is part of a {this_count}-way split, expected {count}")
+        if index in shards:
+            raise ValueError(f"{path}: duplicate shard {index}/{count}")
+        check_shard(path, meta, rows)
+        shards[index] = rows
+
+    missing = sorted(set(range(count)) - set(shards))
+    if missing:
+        raise ValueError(f"missing shards: {', '.join(f'{i}/{count}' for i in missing)}")
+
+    rows = [row for index in range(count) for row in shards[index]]
+    write_results(output, grid, (0, 1), rows, dtype)
+    return len(rows)
+
+def checkpoint_path(output):
+    return output + ".ckpt"
+
+def write_checkpoint(path, state):
+    # write-then-rename so a crash never leaves a torn checkpoint behind
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def load_checkpoint(path, grid, shard, dtype="float64"):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        state = json.load(f)
+    if state["fingerprint"] != grid_fingerprint(grid) or state["shard"] != list(shard):
+        raise ValueError(f"{path}: checkpoint was written for a different grid or shard")
+    if state.get("dtype", "float64") != dtype:
+        raise ValueError(f"{path}: checkpoint was written for {state.get('dtype', 'float64')} results, "
+                         f"resume {'with' if state.get('dtype') == 'float32' else 'without'} --float32")
+    return state
+
+def parse_size(text):
+    # bytes, with an optional K/M/G suffix (powers of 1024)
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper()
+    if text.endswith("B"):
+        text = text[:-1]
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"memory size must look like 512M or 2G, got {text!r}")
+
+def is_complete(output, grid, shard, dtype="float64"):
+    # a finished shard of a different precision is not complete: it is
+    # evaluated again at the requested one
+    try:
+        meta, rows = read_results(output)
+        check_shard(output, meta, rows)
+    except (OSError, ValueError):
+        return False
+    return meta["fingerprint"] == grid_fingerprint(grid) and meta["shard"] == list(shard) and \
+        meta["dtype"] == dtype
+
+def run(output, grid, shard, chunk_size=CHUNK_SIZE, resume=False,
+        max_memory=None, float32=False, memory_report=False):
+    if chunk_size < 1:
+        raise ValueError(f"chunk size must be at least 1, got {chunk_size}")
+    start, stop = shard_range(grid_size(grid), shard)
+    ckpt = checkpoint_path(output)
+    dtype = np.float32 if float32 else np.float64
+
+    state = load_checkpoint(ckpt, grid, shard, np.dtype(dtype).name) if resume else None
+    if state is not None and (not os.path.exists(output) or os.path.getsize(output) < state["offset"]):
+        # the output was removed or cut short since the checkpoint: nothing
+        # to continue from
+        print(f"Shard {shard[0]}/{shard[1]}: {output} does not match its checkpoint, starting over")
+        state = None
+    if state is None and resume and is_complete(output, grid, shard, np.dtype(dtype).name):
+        print(f"Shard {shard[0]}/{shard[1]}: {output} is already complete")
+        return
+
+    if state is None:
+        f = open(output, 'w', newline='')
+        f.write(format_meta(grid, shard, np.dtype(dtype).name))
+        csv.writer(f).writerow(COLUMNS)
+        position = start
+    else:
+        # drop anything written after the last consistent checkpoint
+        f = open(output, 'r+', newline='')
+        f.seek(state["offset"])
+        f.truncate()
+        position = state["next"]
+        print(f"Shard {shard[0]}/{shard[1]}: resuming at point {position}")
+
+    tracing = max_memory is not None or memory_report
+    if max_memory is not None:
+        chunk_size = max(1, int(max_memory * BUDGET_HEADROOM) // BYTES_PER_POINT)
+    if tracing:
+        tracemalloc.start()
+    stage_peaks = {"evaluate": 0, "write": 0}
+
+    def reset_peak():
+        # tracemalloc.reset_peak is Python 3.9+; without it peaks are
+        # cumulative, which only over-estimates (smaller chunks, higher report)
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+
+    def traced(stage, func, *args):
+        if not tracing:
+            return func(*args)
+        reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        value = func(*args)
+        stage_peaks[stage] = max(stage_peaks[stage], tracemalloc.get_traced_memory()[1] - base)
+        return value
+
+    with f:
+        writer = csv.writer(f)
+        while position < stop:
+            chunk_stop = min(position + chunk_size, stop)
+            if tracing:
+                reset_peak()
+                chunk_base, _ = tracemalloc.get_traced_memory()
+            chunk = traced("evaluate", evaluate, grid, position, chunk_stop, dtype)
+            traced("write", lambda: writer.writerows(chunk_rows(grid, chunk)))
+            del chunk
+            f.flush()
+            os.fsync(f.fileno())
+
+            if max_memory is not None:
+                # re-size the next chunk from what this one actually used
+                chunk_peak = tracemalloc.get_traced_memory()[1] - chunk_base
+                per_point = max(chunk_peak / (chunk_stop - position), 1)
+                chunk_size = max(1, int(max_memory * BUDGET_HEADROOM / per_point))
+
+            position = chunk_stop
+            write_checkpoint(ckpt, {
+                "fingerprint": grid_fingerprint(grid),
+                "shard": list(shard),
+                "next": position,
+                "offset": f.tell(),
+                "dtype": np.dtype(dtype).name,
+            })
+
+    if tracing:
+        tracemalloc.stop()
+    if os.path.exists(ckpt):
+        os.remove(ckpt)
+    print(f"Shard {shard[0]}/{shard[1]}: wrote points [{start}, {stop}) to {output}")
+    if tracing:
+        peaks = ", ".join(f"{stage} {peak / (1 << 20):.2f} MiB" for stage, peak in stage_peaks.items())
+        print(f"\tpeak allocation per stage: {peaks}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='evaluate (a shard of) the grid')
+    run_parser.add_argument('output')
+    run_parser.add_argument('--shard', type=parse_shard, default=(0, 1),
+                            help='evaluate shard i of N (0 <= i < N)')
+    run_parser.add_argument('--dram', type=number, nargs='+', default=DRAM_CAPS)
+    run_parser.add_argument('--ssd', type=number, nargs='+', default=SSD_CAPS)
+    run_parser.add_argument('--lifetimes', type=number, nargs='+', default=LIFETIMES)
+    run_parser.add_argument('--locations', nargs='+', default=LOCATIONS,
+                            choices=LOCATIONS, metavar='LOCATION')
+    run_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='points evaluated between checkpoints')
+    run_parser.add_argument('--resume', action='store_true',
+                            help='continue from the checkpoint of an interrupted run')
+    run_parser.add_argument('--max-memory', type=parse_size, default=None,
+                            help='size chunks to keep allocations under this budget (e.g. 512M)')
+    run_parser.add_argument('--float32', action='store_true',
+                            help='hold and write results as float32')
+    run_parser.add_argument('--memory-report', action='store_true',
+                            help='report peak allocation per stage')
+
+    merge_parser = subparsers.add_parser('merge', help='combine shard files and check completeness')
+    merge_parser.add_argument('output')
+    merge_parser.add_argument('shards', nargs='+')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        grid = Grid(args.dram, args.ssd, args.lifetimes, args.locations)
+        try:
+            run(args.output, grid, args.shard, args.chunk_size, args.resume,
+                args.max_memory, args.float32, args.memory_report)
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+    else:
+        try:
+            points = merge_results(args.output, args.shards)
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+        print(f"Merged {len(args.shards)} shards ({points} points) into {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import argparse
+import signal
+import sys
+import time
+
+import numpy as np
+
+from iotrace import read_chunks, split_fields, parse_numbers, parse_strings
+import operational
+from operational import energy_type_carbon, location_carbon, get_carbon_intensity
+import placement
+
+# Operational carbon from measured power instead of the nameplate model in
+# operational.py (cpu_power, dram_power per dram_power_cap_gb, flash_power per
+# flash_max_cap, scaled by usage_discount).
+#
+# Telemetry is comma-separated lines
+#   timestamp,host,cpu_w,dram_w,flash_w[,region]
+# with timestamps in seconds, from files (.gz ok) or stdin (-). Energy is the
+# trapezoid between consecutive samples of a host; an interval longer than
+# --max_gap is a hole in the telemetry and is not integrated. Samples are
+# put in time order within a chunk; one older than the last sample already
+# integrated for its host is dropped. Carbon uses the static
+# intensity of the host's region (a location or energy type, as in
+# get_carbon_intensity), or hourly intensities from placement-style --traces.
+# A region column applies from its sample on: each interval is charged at the
+# region of the sample that starts it.
+#
+# Each chunk is parsed and integrated with array operations; the state is a
+# fixed number of values per host (last sample, energy and carbon totals), so
+# memory does not grow with the stream. A snapshot can be taken at any time:
+# with --every, or by sending SIGUSR1 to a running process.
+#
+#   collector | python telemetry.py - --region US --every 60
+
+MAX_GAP = 300. # seconds
+COMPONENTS = ("cpu", "dram", "flash")
+
+class Accumulator():
+    # running energy (Wh) and carbon (g) per host
+    def __init__(self, region="US", traces=None, trace_start=0., max_gap=MAX_GAP):
+        if traces is None:
+            self.regions = list(location_carbon) + list(energy_type_carbon)
+            self.intensity = np.array([get_carbon_intensity(r) for r in self.regions], dtype=float)[:, None]
+        else:
+            self.regions = list(traces.regions)
+            self.intensity = traces.intensity
+        self.region_index = {r: i for i, r in enumerate(self.regions)}
+        self.default_region = self.get_region(region)
+        self.trace_start = trace_start
+        self.max_gap = max_gap
+
+        self.hosts = {}
+        self.names = []
+        self.last_time = np.zeros(0)
+        self.last_power = np.zeros((0, len(COMPONENTS)))
+        self.region = np.zeros(0, dtype=np.int64)
+        self.energy = np.zeros((0, len(COMPONENTS)))
+        self.carbon = np.zeros(0)
+        self.samples = np.zeros(0, dtype=np.int64)
+        self.seconds = np.zeros(0) # integrated time
+        self.gaps = 0
+        self.dropped = 0
+
+    def get_region(self, name):
+        if name not in self.region_index:
+            raise ValueError(f"unknown region {name!r}")
+        return self.region_index[name]
+
+    def host_ids(self, names):
+        # ids of an array of host names, registering new hosts
+        unique, inverse = np.unique(names, return_inverse=True)
+        ids = np.empty(len(unique), dtype=np.int64)
+        for i, name in enumerate(unique.tolist()):
+            if name not in self.hosts:
+                self.hosts[name] = len(self.names)
+                self.names.append(name.decode(errors="replace"))
+            ids[i] = self.hosts[name]
+        self.grow(len(self.names))
+        return ids[inverse.ravel()]
+
+    def region_ids(self, names):
+        unique, inverse = np.unique(names, return_inverse=True)
+        ids = np.array([self.get_region(r.decode()) for r in unique.tolist()], dtype=np.int64)
+        return ids[inverse.ravel()]
+
+    def grow(self, n):
+        old = len(self.last_time)
+        if n <= old:
+            return
+        extra = n - old
+        self.last_time = np.concatenate([self.last_time, np.full(extra, np.nan)])
+        self.last_power = np.concatenate([self.last_power, np.zeros((extra, len(COMPONENTS)))])
+        self.region = np.concatenate([self.region, np.full(extra, self.default_region)])
+        self.energy = np.concatenate([self.energy, np.zeros((extra, len(COMPONENTS)))])
+        self.carbon = np.concatenate([self.carbon, np.zeros(extra)])
+        self.samples = np.concatenate([self.samples, np.zeros(extra, dtype=np.int64)])
+        self.seconds = np.concatenate([self.seconds, np.zeros(extra)])
+
+    def get_intensity(self, region, seconds):
+        # g/kWh of each region at each time
+        if self.intensity.shape[1] == 1:
+            return self.intensity[region, 0]
+        hour = np.floor((seconds - self.trace_start) / 3600).astype(np.int64)
+        return self.intensity[region, np.clip(hour, 0, self.intensity.shape[1] - 1)]
+
+    def add(self, times, hosts, power, regions=None):
+        # samples: times (s), host ids, power (samples, components) in W and
+        # optionally region ids
+        order = np.lexsort((times, hosts))
+        times, hosts, power = times[order], hosts[order], power[order]
+        if regions is not None:
+            regions = regions[order]
+
+        late = times < self.last_time[hosts] # nan (new host) compares False
+        if late.any():
+            self.dropped += int(late.sum())
+            keep = ~late
+            times, hosts, power = times[keep], hosts[keep], power[keep]
+            if regions is not None:
+                regions = regions[keep]
+        if len(times) == 0:
+            return
+
+        first = np.r_[True, hosts[1:] != hosts[:-1]]
+        last = np.r_[hosts[1:] != hosts[:-1], True]
+
+        prev_time = np.where(first, self.last_time[hosts], np.r_[np.nan, times[:-1]])
+        prev_power = np.where(first[:, None], self.last_power[hosts], np.r_[power[:1], power[:-1]])
+        # an interval is charged at the region in effect at its start
+        prev_region = self.region[hosts]
+        if regions is not None:
+            prev_region = np.where(first, prev_region, np.r_[0, regions[:-1]])
+        dt = times - prev_time
+        interval = dt <= self.max_gap # nan (no previous sample) compares False
+        self.gaps += int((dt > self.max_gap).sum())
+
+        h, dt = hosts[interval], dt[interval]
+        wh = (prev_power[interval] + power[interval]) / 2 * dt[:, None] / 3600
+        grams = wh.sum(axis=1) / 1000 * self.get_intensity(prev_region[interval], prev_time[interval])
+        n = len(self.names)
+        for c in range(len(COMPONENTS)):
+            self.energy[:, c] += np.bincount(h, weights=wh[:, c], minlength=n)
+        self.carbon += np.bincount(h, weights=grams, minlength=n)
+        self.seconds += np.bincount(h, weights=dt, minlength=n)
+        self.samples += np.bincount(hosts, minlength=n)
+
+        self.last_time[hosts[last]] = times[last]
+        self.last_power[hosts[last]] = power[last]
+        if regions is not None:
+            self.region[hosts[last]] = regions[last]
+
+    def snapshot(self):
+        # totals so far: per host and per region, energy in kWh and carbon in kg
+        kwh = self.energy / 1000
+        regions = {}
+        for r in np.unique(self.region).tolist():
+            member = self.region == r
+            regions[self.regions[r]] = {
+                "hosts": int(member.sum()),
+                **{c: float(kwh[member, i].sum()) for i, c in enumerate(COMPONENTS)},
+                "kg": float(self.carbon[member].sum() / 1000),
+            }
+        return {
+            "hosts": {name: {"region": self.regions[self.region[i]],
+                             **{c: float(kwh[i, j]) for j, c in enumerate(COMPONENTS)},
+                             "kg": float(self.carbon[i] / 1000),
+                             "hours": float(self.seconds[i] / 3600)}
+                      for i, name in enumerate(self.names)},
+            "regions": regions,
+            "samples": int(self.samples.sum()),
+            "gaps": self.gaps,
+            "dropped": self.dropped,
+        }
+
+def accumulate(accumulator, path, header=False, chunk_bytes=1 << 20, on_chunk=None):
+    for i, data in enumerate(read_chunks(path, chunk_bytes, live=True)):
+        if i == 0 and header:
+            data = data[data.find(b"\n") + 1:]
+        buf = np.frombuffer(data, dtype=np.uint8)
+        starts, ends = split_fields(buf)
+        if len(starts) == 0:
+            continue
+        if starts.shape[1] not in (5, 6):
+            raise ValueError(f"telemetry has {starts.shape[1]} fields, expected "
+                             "timestamp,host,cpu_w,dram_w,flash_w[,region]")
+        times = parse_numbers(buf, starts[:, 0], ends[:, 0])
+        hosts = accumulator.host_ids(parse_strings(buf, starts[:, 1], ends[:, 1]))
+        power = np.column_stack([parse_numbers(buf, starts[:, c], ends[:, c]) for c in (2, 3, 4)])
+        regions = None
+        if starts.shape[1] == 6:
+            regions = accumulator.region_ids(parse_strings(buf, starts[:, 5], ends[:, 5]))
+        accumulator.add(times, hosts, power, regions)
+        if on_chunk is not None:
+            on_chunk()
+    return accumulator
+
+def nameplate_cpu_watts():
+    # what operational.py charges for a cpu: its power scaled by usage_discount
+    return operational.cpu_power * operational.usage_discount
+
+def report(snap, top):
+    print(f"Snapshot: {len(snap['hosts'])} hosts, {snap['samples']} samples, "
+          f"{snap['gaps']} gaps, {snap['dropped']} dropped")
+    for region, totals in snap["regions"].items():
+        kwh = sum(totals[c] for c in COMPONENTS)
+        print(f"\t{region}: {totals['hosts']} hosts, {kwh:.3f} kWh (" +
+              ", ".join(f"{c} {totals[c]:.3f}" for c in COMPONENTS) + f"), {totals['kg']:.3f} kg CO2")
+    hosts = sorted(snap["hosts"].items(), key=lambda item: -item[1]["kg"])[:top]
+    for name, totals in hosts:
+        watts = {c: totals[c] * 1000 / totals["hours"] if totals["hours"] else 0. for c in COMPONENTS}
+        print(f"\t\t{name} ({totals['region']}): {totals['kg']:.4f} kg CO2 over "
+              f"{totals['hours']:.2f} h, mean " + ", ".join(f"{c} {watts[c]:.1f} W" for c in COMPONENTS) +
+              f" (nameplate cpu {nameplate_cpu_watts():.1f} W)")
+    sys.stdout.flush()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('telemetry', nargs='+', help='telemetry files (.gz ok, - for stdin)')
+    parser.add_argument('--header', action='store_true') # skip the first line of each file
+    parser.add_argument('--region', default='US') # hosts without a region column
+    parser.add_argument('--traces', nargs='+', default=None) # hourly intensities, as in placement.py
+    parser.add_argument('--trace_start', type=float, default=0) # timestamp of trace hour 0
+    parser.add_argument('--max_gap', type=float, default=MAX_GAP) # seconds
+    parser.add_argument('--every', type=float, default=0) # print a snapshot every this many seconds
+    parser.add_argument('--top', type=int, default=10) # hosts listed per snapshot
+    args = parser.parse_args()
+
+    requested = [False]
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: requested.__setitem__(0, True))
+    last_report = [time.monotonic()]
+    def on_chunk():
+        now = time.monotonic()
+        if requested[0] or (args.every and now - last_report[0] >= args.every):
+            requested[0] = False
+            last_report[0] = now
+            report(accumulator.snapshot(), args.top)
+
+    start = time.perf_counter()
+    accumulator = None
+    try:
+        traces = placement.read_traces(args.traces) if args.traces else None
+        accumulator = Accumulator(args.region, traces, args.trace_start, args.max_gap)
+        for path in args.telemetry:
+            accumulate(accumulator, path, args.header, on_chunk=on_chunk)
+    except (ValueError, OSError) as e:
+        sys.exit(f"Error: {e}")
+    except KeyboardInterrupt:
+        if accumulator is None: # interrupted while loading traces: nothing to report
+            sys.exit("Interrupted")
+    elapsed = time.perf_counter() - start
+
+    snap = accumulator.snapshot()
+    report(snap, args.top)
+    print(f"{snap['samples'] + snap['dropped']} samples in {elapsed:.2f} s "
+          f"({(snap['samples'] + snap['dropped']) / max(elapsed, 1e-9):.0f}/s)")
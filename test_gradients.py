@@ -0,0 +1,65 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import unittest
+
+import numpy as np
+
+import component
+from dellrexp import ic_yield
+from gradients import PARAMETERS, batch_total, get_total_carbon_grad, smooth_points
+from operational import get_carbon_intensity
+
+###############################
+# The analytic partials of gradients.py against central differences of the
+# batched model (dellrexp / operational) at points away from the module-count
+# steps. Run with `python -m unittest test_gradients` from the repository.
+###############################
+POINTS = 2000
+REL_STEP = 1e-4
+RTOL = 1e-6
+
+class GradientTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # read the model configs next to this file, wherever the tests run from
+        cls.prefix = component.prefix
+        component.prefix = os.path.dirname(os.path.abspath(__file__))
+        cls.points = smooth_points(POINTS, np.random.default_rng(0), REL_STEP)
+
+    @classmethod
+    def tearDownClass(cls):
+        component.prefix = cls.prefix
+
+    def central_difference(self, f, points, name):
+        h = REL_STEP * np.maximum(np.abs(points[name]), 1.)
+        return (f(**{**points, name: points[name] + h}) - f(**{**points, name: points[name] - h})) / (2 * h)
+
+    def test_values_match_batched_model(self):
+        rng = np.random.default_rng(1)
+        dram, ssd = rng.integers(0, 2048, POINTS), rng.integers(0, 30720, POINTS)
+        total, _ = get_total_carbon_grad(dram, ssd, 5, get_carbon_intensity("US"))
+        np.testing.assert_allclose(total, batch_total(dram, ssd, 5, get_carbon_intensity("US")), rtol=1e-14, atol=0)
+
+    def test_partials_match_batched_model(self):
+        points = {name: self.points[name] for name in PARAMETERS if name != "fab_yield"}
+        _, grad = get_total_carbon_grad(**points, fab_yield=ic_yield)
+        for name in points:
+            with self.subTest(parameter=name):
+                np.testing.assert_allclose(grad[name], self.central_difference(batch_total, points, name),
+                                           rtol=RTOL, atol=0)
+
+    def test_partials_at_other_fab_yields(self):
+        # the batched model is fixed at ic_yield; other yields scale its IC carbon
+        _, grad = get_total_carbon_grad(**self.points)
+        total = lambda **p: get_total_carbon_grad(**p)[0]
+        for name in PARAMETERS:
+            with self.subTest(parameter=name):
+                np.testing.assert_allclose(grad[name], self.central_difference(total, self.points, name),
+                                           rtol=RTOL, atol=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import argparse
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from dram_model import Fab_DRAM
+from hdd_model import Fab_HDD
+from ssd_model import Fab_SSD
+from fw_experiments import DENSITIES, get_flash_cap, get_flash_cost, get_dram_cost
+import operational
+
+# Storage tiering solver: split a working set across DRAM, SSD (per density
+# class) and HDD to minimize carbon or cost per year, subject to a mean access
+# latency target and the SSD endurance needed for the write rate.
+#
+# Data is placed hottest first: DRAM holds the hottest d GB, SSD the next s GB
+# and HDD the remaining h = W - d - s GB. Accesses follow a power-law CDF
+# F(x) = x^a over the hottest fraction x of the data, with a chosen so that
+# the hottest `hot_fraction` of the data receives `hot_access` of accesses
+# (0.2 / 0.8 is the 80-20 rule).
+#
+# For a fixed d the latency is monotone in s, so the smallest feasible s has a
+# closed form; the objective is linear in s, so the optimum for that d is
+# either that smallest s or all remaining data on SSD. Only d is searched,
+# vectorized over a grid and refined around the best point.
+
+DRAM_CONFIG = "ddr4_10nm"
+SSD_CONFIG = "western_digital_2019"
+HDD_CONFIG = "Exosx16"
+IC_YIELD = 0.875
+
+LATENCY_US = {"dram": 0.1, "ssd": 100, "hdd": 10000} # mean access latency
+HDD_COST_PER_TB = 15.
+
+SEARCH_POINTS = 4096
+REFINE_ROUNDS = 3
+
+Placement = namedtuple("Placement", ["density", "dram", "ssd", "hdd", "carbon", "cost", "latency"])
+
+def access_exponent(hot_fraction, hot_access):
+    assert 0 < hot_fraction < 1 and 0 < hot_access < 1, "skew fractions must be in (0, 1)"
+    return math.log(hot_access) / math.log(hot_fraction)
+
+def get_latency(dram, ssd, working_set, a, latency=LATENCY_US):
+    # mean access latency (us) of a placement, vectorized over dram/ssd
+    f_dram = np.clip(dram / working_set, 0, 1) ** a
+    f_fast = np.clip((dram + ssd) / working_set, 0, 1) ** a
+    return f_dram * latency["dram"] + (f_fast - f_dram) * latency["ssd"] + (1 - f_fast) * latency["hdd"]
+
+def min_ssd_for_latency(dram, working_set, a, target, latency=LATENCY_US):
+    # smallest SSD capacity meeting the target for each DRAM capacity (inf if none)
+    f_dram = np.clip(dram / working_set, 0, 1) ** a
+    fast_required = (latency["hdd"] - target - f_dram * (latency["ssd"] - latency["dram"])) \
+                    / (latency["hdd"] - latency["ssd"])
+    fast_gb = working_set * np.clip(fast_required, 0, 1) ** (1 / a)
+    ssd = np.maximum(fast_gb - dram, 0)
+    return np.where(fast_required > 1 + 1e-12, np.inf, ssd)
+
+def tier_coefficients(region, lifetime, density):
+    # per-GB-year carbon (kg) and cost ($) of each tier, plus the SSD fixed cost
+    ci = operational.get_carbon_intensity(region)
+    def kg_per_year(watts):
+        return operational.get_carbon_emissions(ci, operational.get_kwh_per_year([watts]))[0]
+
+    dram = Fab_DRAM(config=DRAM_CONFIG, fab_yield=IC_YIELD)
+    ssd = Fab_SSD(config=SSD_CONFIG, fab_yield=IC_YIELD)
+    hdd = Fab_HDD(config=HDD_CONFIG)
+    ssd_scale = density[1]
+
+    carbon = {
+        "dram": dram.get_cpg() / 1000. / lifetime + kg_per_year(operational.dram_power / operational.dram_power_cap_gb),
+        "ssd": ssd_scale * (ssd.get_cpg() / 1000. / lifetime + kg_per_year(operational.flash_power / operational.flash_max_cap)),
+        "hdd": hdd.get_cpg() / 1000. / lifetime + kg_per_year(operational.hdd_power / operational.hdd_max_cap),
+    }
+    cost = {
+        "dram": get_dram_cost(1) / lifetime,
+        "ssd": (get_flash_cost(ssd_scale) - get_flash_cost(0)) / lifetime,
+        "hdd": HDD_COST_PER_TB / 1024 / lifetime,
+    }
+    return carbon, cost, get_flash_cost(0) / lifetime
+
+def evaluate(dram, ssd, working_set, carbon, cost, ssd_fixed):
+    hdd = working_set - dram - ssd
+    total_carbon = carbon["dram"] * dram + carbon["ssd"] * ssd + carbon["hdd"] * hdd
+    total_cost = cost["dram"] * dram + cost["ssd"] * ssd + cost["hdd"] * hdd + np.where(ssd > 0, ssd_fixed, 0)
+    return total_carbon, total_cost
+
+def best_for_dram(dram, working_set, a, target, endurance_gb, carbon, cost, ssd_fixed, objective):
+    # optimal SSD capacity and objective for each DRAM capacity
+    low = min_ssd_for_latency(dram, working_set, a, target)
+    # any SSD at all must also carry the write endurance
+    low = np.where(low > 0, np.maximum(low, endurance_gb), low)
+    high = working_set - dram
+
+    best_ssd = np.full(dram.shape, np.nan)
+    best = np.full(dram.shape, np.inf)
+    for ssd in (low, high):
+        feasible = np.isfinite(ssd) & (ssd >= low - 1e-9) & (ssd <= high + 1e-9) \
+                   & ((ssd == 0) | (ssd >= endurance_gb - 1e-9))
+        ssd = np.where(feasible, np.minimum(ssd, high), 0)
+        total_carbon, total_cost = evaluate(dram, ssd, working_set, carbon, cost, ssd_fixed)
+        value = np.where(feasible, total_carbon if objective == "carbon" else total_cost, np.inf)
+        better = value < best
+        best = np.where(better, value, best)
+        best_ssd = np.where(better, ssd, best_ssd)
+    return best_ssd, best
+
+def solve(working_set, write_mbs, lifetime, target_latency, hot_fraction=.2, hot_access=.8,
+          objective="carbon", region="wind-solar", densities=DENSITIES):
+    assert objective in ("carbon", "cost"), "objective must be carbon | cost"
+    a = access_exponent(hot_fraction, hot_access)
+
+    best = None
+    for name, density in densities.items():
+        carbon, cost, ssd_fixed = tier_coefficients(region, lifetime, density)
+        endurance_gb = get_flash_cap(0, write_mbs, lifetime, density[0])
+
+        lo, hi = 0., float(working_set)
+        d = s = None
+        best_value = np.inf
+        for _ in range(REFINE_ROUNDS):
+            dram = np.linspace(lo, hi, SEARCH_POINTS)
+            ssd, value = best_for_dram(dram, working_set, a, target_latency, endurance_gb,
+                                       carbon, cost, ssd_fixed, objective)
+            i = int(np.argmin(value))
+            if not np.isfinite(value[i]):
+                break
+            if value[i] < best_value:
+                d, s, best_value = float(dram[i]), float(ssd[i]), value[i]
+            step = (hi - lo) / (SEARCH_POINTS - 1)
+            lo, hi = max(0., dram[i] - step), min(float(working_set), dram[i] + step)
+
+        if d is None:
+            continue
+        total_carbon, total_cost = evaluate(np.float64(d), np.float64(s), working_set, carbon, cost, ssd_fixed)
+        placement = Placement(name, d, s, working_set - d - s, float(total_carbon), float(total_cost),
+                              float(get_latency(d, s, working_set, a)))
+        if best is None or getattr(placement, objective) < getattr(best, objective):
+            best = placement
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('working_set', type=float) # GB
+    parser.add_argument('--write_rate', type=float, default=10) # MB/s
+    parser.add_argument('--lifetime', type=float, default=5) # years
+    parser.add_argument('--latency', type=float, default=500) # target mean access latency, us
+    parser.add_argument('--hot_fraction', type=float, default=.2)
+    parser.add_argument('--hot_access', type=float, default=.8)
+    parser.add_argument('--objective', choices=["carbon", "cost"], default="carbon")
+    parser.add_argument('--region', default="wind-solar")
+    args = parser.parse_args()
+
+    p = solve(args.working_set, args.write_rate, args.lifetime, args.latency,
+              args.hot_fraction, args.hot_access, args.objective, args.region)
+    if p is None:
+        print("No placement meets the latency target")
+    else:
+        print(f"{p.density}: DRAM {p.dram:.1f} GB, SSD {p.ssd:.1f} GB, HDD {p.hdd:.1f} GB")
+        print(f"\tcarbon {p.carbon:.2f} kg/year, cost {p.cost:.2f} $/year, latency {p.latency:.1f} us")